@@ -0,0 +1,62 @@
+"""
+Throughput of sign_many for growing worker counts, against signing the
+same requests one by one in this process.
+
+    python benchmarks/bench_batch.py [path_to_private_key] [-n 2000] [--workers 1 2 4 8] [--mode process thread]
+
+Speedup is relative to the serial run; with process workers it should grow
+close to linearly up to the number of cores.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import common  # noqa: F401 (puts upcpayment on sys.path)
+
+from upcpayment.batch import sign_many
+from upcpayment.keyring import load_private_key
+from upcpayment.samples import generate_key_file, sample_request
+from upcpayment.signer import get_signer
+from upcpayment.Upc_payment_xml import AuthorizationRequest
+
+
+def worker_counts():
+    counts, count = [], 1
+    while count < (os.cpu_count() or 1):
+        counts.append(count)
+        count *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('private_key', nargs='?')
+    parser.add_argument('-n', '--number', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=worker_counts())
+    parser.add_argument('--mode', nargs='+', default=['process', 'thread'], choices=('process', 'thread'))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        key_path = args.private_key or generate_key_file(directory)[0]
+        requests = [sample_request(AuthorizationRequest, order_id=str(number)) for number in range(args.number)]
+
+        signer = get_signer(load_private_key(key_path))
+        start = time.perf_counter()
+        for request in requests:
+            signer.sign(request)
+        serial = time.perf_counter() - start
+        print('{:<8} {:>7} {:>10.0f} docs/s {:>6.2f}x'.format('serial', 1, args.number / serial, 1))
+
+        for mode in args.mode:
+            for workers in args.workers:
+                start = time.perf_counter()
+                for _ in sign_many(requests, key_path, workers=workers, mode=mode):
+                    pass
+                seconds = time.perf_counter() - start
+                print('{:<8} {:>7} {:>10.0f} docs/s {:>6.2f}x'.format(mode, workers, args.number / seconds,
+                                                                      serial / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Import time of the upcpayment modules, measured with python -X importtime
+in a fresh interpreter, against a budget.
+
+    python benchmarks/bench_import.py [-r 5] [-o results.json]
+
+The exit code is 1 if a module takes longer than its budget or loads
+lxml, signxml, OpenSSL or cryptography at import time - they must be
+loaded on first use only.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+# milliseconds, with room for slow machines
+BUDGETS = {
+    'upcpayment.Upc_payment': 30,
+    'upcpayment.Upc_payment_xml': 150,
+    'upcpayment.serializer': 15,
+    'upcpayment.signer': 30,
+    'upcpayment.truststore': 30,
+    'upcpayment.timing': 10,
+}
+HEAVY = ('lxml', 'signxml', 'OpenSSL', 'cryptography')
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'upcpayment')
+
+
+def import_time(module):
+    """
+    Returns (milliseconds spent importing the package, heavy packages loaded).
+    """
+    env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                             env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    total, heavy = 0, set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        package = name.strip().split('.')[0]
+        if package in HEAVY:
+            heavy.add(package)
+        # nested imports are indented and part of the cumulative time of the top level ones
+        if package == 'upcpayment' and len(name) - len(name.lstrip()) == 1:
+            total += int(cumulative)
+    return total / 1000, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output')
+    args = parser.parse_args()
+
+    results, failed = [], False
+    for module, budget in BUDGETS.items():
+        runs = [import_time(module) for _ in range(args.repeat)]
+        milliseconds = min(run[0] for run in runs)
+        heavy = sorted(set().union(*(run[1] for run in runs)))
+        ok = milliseconds <= budget and not heavy
+        failed = failed or not ok
+        results.append({'module': module, 'ms': round(milliseconds, 2), 'budget_ms': budget, 'heavy': heavy})
+        print('{:<30} {:>8.1f} ms  budget {:>4} ms  {}{}'.format(
+            module, milliseconds, budget, 'ok' if ok else 'OVER', '  loads ' + ', '.join(heavy) if heavy else ''),
+            file=sys.stderr)
+
+    report = {'python': platform.python_version(), 'platform': platform.platform(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=1)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
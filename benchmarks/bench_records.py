@@ -0,0 +1,66 @@
+"""
+Memory and construction time of the slotted response dataclasses versus
+plain frozen dataclasses with the same fields.
+
+    python benchmarks/bench_records.py [-n 100000]
+"""
+import argparse
+import tracemalloc
+from dataclasses import fields, make_dataclass
+
+from common import seconds_per_call
+
+from upcpayment import Upc_payment_xml
+
+
+def plain_dataclass(cls):
+    return make_dataclass('Plain' + cls.__name__, [(field.name, field.type, field) for field in fields(cls)],
+                          frozen=True, order=True)
+
+
+def bytes_per_instance(build, rows):
+    tracemalloc.start()
+    instances = [build(row) for row in rows]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del instances
+    return size / len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    for cls in (Upc_payment_xml.AuthorizationResponse, Upc_payment_xml.TransactionStateResponse):
+        plain = plain_dataclass(cls)
+        names = [field.name for field in fields(cls)]
+        row = tuple('{}-value'.format(name) for name in names)
+        record = dict(zip(names, row))
+        # values are shared between the instances, so only the instances are counted
+        rows = [row] * args.number
+
+        print(cls.__name__)
+        cases = [
+            ('plain frozen dataclass, cls(*row)', lambda: plain(*row), lambda row: plain(*row)),
+            ('slotted, cls(*row)', lambda: cls(*row), lambda row: cls(*row)),
+            ('slotted, from_row(row)', lambda: cls.from_row(row), cls.from_row),
+            ('plain frozen dataclass, cls(**record)', lambda: plain(**record), None),
+            ('slotted, cls(**record)', lambda: cls(**record), None),
+        ]
+        for name, func, build in cases:
+            line = '  {:<40} {:>8.0f} ns'.format(name, seconds_per_call(func, args.number) * 1e9)
+            if build is not None:
+                line += ' {:>8.0f} bytes'.format(bytes_per_instance(build, rows))
+            print(line)
+
+        for name, batch, build in (('tuples', [row] * 1000, lambda batch: [cls(*row) for row in batch]),
+                                   ('dicts', [record] * 1000, lambda batch: [cls(**record) for record in batch])):
+            count = max(args.number // len(batch), 1)
+            for label, func in (('[cls(...) for ...]', build), ('from_records', cls.from_records)):
+                seconds = seconds_per_call(lambda: func(batch), count)
+                print('  {:<40} {:>8.0f} ns'.format('{}, {}, per record'.format(label, name),
+                                                    seconds / len(batch) * 1e9))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Per-document cost of the signxml path (XMLSigner on the lxml tree, as the
+SDK signed before EnvelopedSigner) versus EnvelopedSigner on the serialized document.
+
+    python benchmarks/bench_signer.py [path_to_private_key] [-n 2000]
+"""
+import argparse
+import tempfile
+
+from common import seconds_per_call
+from lxml import etree
+import signxml
+
+from upcpayment import Upc_payment_xml
+from upcpayment.keyring import load_private_key
+from upcpayment.samples import generate_key_file
+from upcpayment.signer import EnvelopedSigner
+
+
+def sign_with_signxml(xml, private_key):
+    # signxml does c14n, digest and RSA in one call
+    signed_root = signxml.XMLSigner(method=signxml.methods.enveloped, signature_algorithm='rsa-sha1',
+                                    digest_algorithm='sha1', c14n_algorithm='http://www.w3.org/2001/10/xml-exc-c14n#'
+                                    ).sign(xml, key=load_private_key(private_key))
+    return etree.tostring(signed_root)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('private_key', nargs='?')
+    parser.add_argument('-n', '--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        key_path = args.private_key or generate_key_file(directory)[0]
+        key = load_private_key(key_path)
+        signer = EnvelopedSigner(key)
+        request = Upc_payment_xml.AuthorizationRequest('1756190', 'E7884956', '123', '20201010120000', '100', '980',
+                                                       'description', '4111111111111111', '25', '12', '123',
+                                                       'Y', 'cavv', '05', '2')
+        cases = [
+            ('signxml (tree + XMLSigner, key from path)',
+             lambda: sign_with_signxml(request.generate_xml(), key_path)),
+            ('signxml (tree + XMLSigner, loaded key)',
+             lambda: sign_with_signxml(request.generate_xml(), key)),
+            ('EnvelopedSigner (serialize + digest + RSA)', lambda: signer.sign(request)),
+        ]
+        for name, func in cases:
+            seconds = seconds_per_call(func, args.number)
+            print('{:<48} {:>9.1f} us/doc'.format(name, seconds * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Throughput of every request/response type, stage by stage, with generated test keys.
+
+    python benchmarks/bench_suite.py [-n 500] [-o results.json] [--compare baseline.json] [--threshold 0.2]
+
+Stages: build (dataclass), build_tree (lxml reference), serialize, sign
+(digest + RSA of the serialized document), generate_xml_with_signature
+(all of it) and parse_response (signature check + fields), plus
+Upc_payment.generate_signature and PaymentPage notification checks. The JSON output
+can be passed to --compare for a later run; the exit code is 1 if any stage
+got slower than the baseline by more than --threshold.
+"""
+import argparse
+import base64
+import json
+import platform
+import sys
+import tempfile
+from dataclasses import asdict, fields
+from urllib.parse import urlencode
+
+from common import seconds_per_call
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+import upcpayment
+from upcpayment import Upc_payment_xml
+from upcpayment.samples import SAMPLE_VALUES, generate_key_file, sample_request
+from upcpayment.notification import NotificationVerifier, parse_notification
+from upcpayment.serializer import serialize
+from upcpayment.signer import EnvelopedSigner
+from upcpayment.truststore import TrustStore
+from upcpayment.Upc_payment import Upc_payment
+
+
+def sample_response(request, signer):
+    """
+    Signed gateway response with every field of the response dataclass.
+    """
+    response_class = Upc_payment_xml._RESPONSE_CLASSES[type(request)]
+    values = {'tran_code': '000', 'comment': 'Approved', 'host_code': '00', 'cvresult': 'M', 'code': '0',
+              'enrolled': 'Y', 'acsurl': 'https://acs.example/', 'pareq': 'eJxVUt1ugjAU', 'xid': 'MDAwMDAwMDAwMDAx'}
+    data = ''.join('<{0}>{1}</{0}>'.format(Upc_payment_xml._RESPONSE_TAGS[field.name],
+                                           values.get(field.name, SAMPLE_VALUES.get(field.name, '')))
+                   for field in fields(response_class))
+    canonical = ('<ECommerceConnect><Message id="{0}" version="1.0"><XMLPayResponse><ResponseData>{1}'
+                 '</ResponseData></XMLPayResponse></Message></ECommerceConnect>').format(request.order_id, data)
+    return signer.sign_canonical(canonical.encode('utf-8')).decode('ascii')
+
+
+def sample_notification(payment, key):
+    """
+    Urlencoded PaymentPage notification for the payment, signed with the test key.
+    """
+    form = {'MerchantID': payment.merchantId, 'TerminalID': payment.terminalid, 'OrderID': str(payment.order_id),
+            'PurchaseTime': payment.purchase_time, 'Currency': payment.currency,
+            'TotalAmount': str(payment.total_amount), 'XID': 'MDAwMDAwMDAwMDAx', 'TranCode': '000',
+            'ApprovalCode': 'A1B2C3', 'Rrn': '123456789012', 'SD': payment.sd, 'Signature': ''}
+    data = parse_notification(form).signed_data().encode('utf-8')
+    form['Signature'] = base64.b64encode(key.sign(data, padding.PKCS1v15(), hashes.SHA1())).decode('ascii')
+    return urlencode(form).encode('ascii')
+
+
+def run(number, key_path, cert_path):
+    signer = EnvelopedSigner(key_path)
+    trust_store = TrustStore(cert_path)
+    results = []
+
+    def measure(message_type, stage, func, count=number):
+        seconds = seconds_per_call(func, count)
+        results.append({'message_type': message_type, 'stage': stage,
+                        'us_per_op': round(seconds * 1e6, 3), 'ops_per_sec': round(1 / seconds, 1)})
+        print('{:<38} {:<28} {:>10.1f} us'.format(message_type, stage, seconds * 1e6), file=sys.stderr)
+
+    for request_class in Upc_payment_xml._RESPONSE_CLASSES:
+        name = request_class.__name__
+        request = sample_request(request_class)
+        kwargs = asdict(request)
+        canonical = serialize(request)
+        response = sample_response(request, signer)
+        slow = max(number // 10, 1)
+
+        measure(name, 'build', lambda: request_class(**kwargs), number * 10)
+        measure(name, 'build_tree', request.generate_xml, number)
+        measure(name, 'serialize', lambda: serialize(request), number * 10)
+        measure(name, 'sign', lambda: signer.sign_canonical(canonical), slow)
+        measure(name, 'generate_xml_with_signature', lambda: request.generate_xml_with_signature(signer), slow)
+        measure(name, 'parse_response', lambda: Upc_payment_xml.parse_response(request, response, trust_store), slow)
+
+    payment = Upc_payment('1756190', 'E7884956', 10000, '980', 'ua', 1234567890, 'Order description', sd='sd')
+    measure('Upc_payment', 'generate_signature', lambda: payment.generate_signature(key_path), max(number // 10, 1))
+
+    notification = sample_notification(payment, signer.key)
+    verifier = NotificationVerifier(trust_store)
+    measure('PaymentNotification', 'verify', lambda: verifier.verify(notification), number)
+    return results
+
+
+def compare(results, baseline, threshold):
+    old = {(item['message_type'], item['stage']): item['us_per_op'] for item in baseline['results']}
+    regressions = []
+    for item in results:
+        before = old.get((item['message_type'], item['stage']))
+        if before:
+            change = item['us_per_op'] / before - 1
+            if change > threshold:
+                regressions.append(item)
+            print('{:<38} {:<28} {:>+8.1%}'.format(item['message_type'], item['stage'], change), file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=500)
+    parser.add_argument('-o', '--output')
+    parser.add_argument('--compare')
+    parser.add_argument('--threshold', type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        key_path, cert_path = generate_key_file(directory)
+        results = run(args.number, key_path, cert_path)
+
+    report = {'version': upcpayment.__version__, 'python': platform.python_version(),
+              'platform': platform.platform(), 'number': args.number, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+import os
+import sys
+import timeit
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'upcpayment'))
+warnings.simplefilter('ignore')
+
+
+def seconds_per_call(func, number, repeat=3):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
@@ -15,8 +15,10 @@ setuptools.setup(
     url="https://github.com/upcecconnect/PythonSDK",
     package_dir={"": "upcpayment"},
     packages=setuptools.find_packages(where="upcpayment"),
+    package_data={"upcpayment": ["schema/*.xsd"]},
     python_requires=">=3.7",
-    install_requires=['pyOpenSSL', 'signxml'],
+    install_requires=['pyOpenSSL', 'signxml', 'cryptography'],
+    extras_require={'numpy': ['numpy']},
     classifiers=[
          "Programming Language :: Python :: 3",
          "Programming Language :: Python :: 3.7",
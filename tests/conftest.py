@@ -0,0 +1,37 @@
+import os
+import sys
+import warnings
+
+import pytest
+import signxml
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'upcpayment'))
+warnings.simplefilter('ignore')
+
+from upcpayment.keyring import load_private_key
+from upcpayment.samples import generate_key_file
+
+
+@pytest.fixture(scope='session')
+def key_files(tmp_path_factory):
+    """
+    (key_path, cert_path) of a test key, shared by all tests.
+    """
+    return generate_key_file(tmp_path_factory.mktemp('keys'))
+
+
+def _signxml_sign(root, private_key):
+    signed_root = signxml.XMLSigner(method=signxml.methods.enveloped, signature_algorithm='rsa-sha1',
+                                    digest_algorithm='sha1', c14n_algorithm='http://www.w3.org/2001/10/xml-exc-c14n#'
+                                    ).sign(root, key=load_private_key(private_key))
+    return etree.tostring(signed_root)
+
+
+@pytest.fixture
+def signxml_sign():
+    """
+    sign(root, private_key): the document signed by signxml and written by
+    lxml.etree.tostring, the reference for EnvelopedSigner.
+    """
+    return _signxml_sign
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from upcpayment.async_client import AsyncGatewayClient
+from upcpayment.exceptions import GatewayError
+from upcpayment.samples import sample_request
+from upcpayment.simulator import GatewaySimulator
+from upcpayment.Upc_payment_xml import AuthorizationRequest, TransactionStateRequest
+
+
+class StandInServer(object):
+    """
+    Keep-alive HTTP server answering every POST with its body. `delay` holds
+    each answer back; `drop` is a set of request numbers (from 1) whose
+    connection is closed after the request was read, without an answer;
+    with `close_idle` every connection is closed after one answer.
+    """
+    def __init__(self, delay=0.0, drop=(), close_idle=False, handle=None):
+        self.delay = delay
+        self.drop = set(drop)
+        self.close_idle = close_idle
+        self.handle = handle
+        self.requests = 0
+        self.connections = 0
+        self.open_connections = 0
+        self.max_open_connections = 0
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self.open_connections += 1
+        self.max_open_connections = max(self.max_open_connections, self.open_connections)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    name, _, value = line.partition(b':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers[b'content-length']))
+                self.requests += 1
+                if self.requests in self.drop:
+                    break
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                status, answer = (await self.handle(body)) if self.handle else (200, body)
+                writer.write(b'HTTP/1.1 %d OK\r\nContent-Length: %d\r\n\r\n' % (status, len(answer)) + answer)
+                await writer.drain()
+                if self.close_idle:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        self.url = 'http://127.0.0.1:{}/xmlpay'.format(self.server.sockets[0].getsockname()[1])
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 10))
+
+
+def client(server, key_files, **options):
+    return AsyncGatewayClient(server.url, key_files[0], key_files[1], **options)
+
+
+def test_sequential_requests_reuse_one_connection(key_files):
+    async def scenario():
+        async with StandInServer() as server, client(server, key_files) as gateway:
+            answers = [await gateway.post(b'request %d' % number) for number in range(5)]
+            return server, answers
+    server, answers = run(scenario())
+    assert answers == [b'request %d' % number for number in range(5)]
+    assert server.connections == 1
+
+
+def test_pool_size_limits_connections(key_files):
+    async def scenario():
+        async with StandInServer(delay=0.05) as server, client(server, key_files, pool_size=2) as gateway:
+            answers = await asyncio.gather(*(gateway.post(b'%d' % number) for number in range(8)))
+            return server, answers
+    server, answers = run(scenario())
+    assert answers == [b'%d' % number for number in range(8)]
+    assert server.connections == 2
+    assert server.max_open_connections == 2
+
+
+def test_unanswered_request_is_not_sent_again(key_files):
+    async def scenario():
+        async with StandInServer(drop={2}) as server, client(server, key_files) as gateway:
+            await gateway.post(b'first')
+            with pytest.raises(GatewayError):
+                await gateway.post(b'second')
+            return server
+    server = run(scenario())
+    assert server.requests == 2
+
+
+def test_unanswered_idempotent_request_is_sent_again(key_files):
+    async def scenario():
+        async with StandInServer(drop={2}) as server, client(server, key_files) as gateway:
+            await gateway.post(b'first')
+            answer = await gateway.post(b'second', idempotent=True)
+            return server, answer
+    server, answer = run(scenario())
+    assert answer == b'second'
+    assert (server.requests, server.connections) == (3, 2)
+
+
+def test_connection_closed_while_idle_is_replaced(key_files):
+    async def scenario():
+        async with StandInServer(close_idle=True) as server, client(server, key_files) as gateway:
+            await gateway.post(b'first')
+            await asyncio.sleep(0.05)
+            answer = await gateway.post(b'second')
+            return server, answer
+    server, answer = run(scenario())
+    assert answer == b'second'
+    assert (server.requests, server.connections) == (2, 2)
+
+
+def test_timeout_frees_the_connection(key_files):
+    async def scenario():
+        async with StandInServer(delay=0.5) as server, client(server, key_files, pool_size=1,
+                                                              timeout=0.1) as gateway:
+            request = sample_request(TransactionStateRequest)
+            with pytest.raises(asyncio.TimeoutError):
+                await gateway.send(request)
+            server.delay = 0
+            return await gateway.post(b'after timeout')
+    assert run(scenario()) == b'after timeout'
+
+
+def test_send_returns_parsed_response(key_files):
+    simulator = GatewaySimulator(key_files[0], key_files[1])
+
+    async def scenario():
+        async with StandInServer(handle=simulator.handle) as server, client(server, key_files) as gateway:
+            return await asyncio.gather(*(gateway.send(sample_request(AuthorizationRequest, order_id=str(number)))
+                                          for number in range(3)))
+    responses = run(scenario())
+    assert [response.order_id for response in responses] == ['0', '1', '2']
+    assert {response.tran_code for response in responses} == {'000'}
@@ -0,0 +1,71 @@
+import pytest
+
+from upcpayment.batch import sign_many
+from upcpayment.keyring import Keyring
+from upcpayment.samples import generate_key_file, sample_request
+from upcpayment.Upc_payment import Upc_payment
+from upcpayment.Upc_payment_xml import AuthorizationRequest
+
+
+def requests(count, merchant_id='1756190'):
+    return [sample_request(AuthorizationRequest, merchant_id=merchant_id, order_id=str(number))
+            for number in range(count)]
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_results_in_input_order(key_files, mode):
+    items = requests(10)
+    results = list(sign_many(items, key_files[0], workers=2, mode=mode, chunksize=3))
+    assert [item for item, _ in results] == items
+    assert [xml for _, xml in results] == [item.generate_xml_with_signature(key_files[0]) for item in items]
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_unordered_results(key_files, mode):
+    items = requests(10)
+    results = {item.order_id: xml
+               for item, xml in sign_many(items, key_files[0], workers=3, mode=mode, ordered=False, chunksize=2)}
+    assert results == {item.order_id: item.generate_xml_with_signature(key_files[0]) for item in items}
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_payment_signature_is_stored(key_files, mode):
+    payments = [Upc_payment('1756190', 'E7884956', 100 + number, '980', 'ua', number, 'description')
+                for number in range(5)]
+    results = list(sign_many(payments, key_files[0], workers=2, mode=mode, chunksize=2))
+    for payment, signature in results:
+        assert payment.signature == signature
+        expected = Upc_payment(payment.merchantId, payment.terminalid, payment.total_amount, payment.currency,
+                               payment.locale, payment.order_id, payment.purchase_desc)
+        expected.purchase_time = payment.purchase_time
+        expected.generate_signature(key_files[0])
+        assert signature == expected.signature
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_keyring_picks_key_per_item(tmp_path, mode):
+    first, _ = generate_key_file(tmp_path, 'first')
+    second, _ = generate_key_file(tmp_path, 'second')
+    keyring = Keyring()
+    keyring.add('m1', 'E7884956', first)
+    keyring.add('m2', 'E7884956', second)
+
+    items = requests(3, 'm1') + requests(3, 'm2')
+    results = list(sign_many(items, keyring, workers=2, mode=mode, chunksize=2))
+    assert [xml for _, xml in results] == \
+        [item.generate_xml_with_signature(first) for item in items[:3]] + \
+        [item.generate_xml_with_signature(second) for item in items[3:]]
+
+
+@pytest.mark.parametrize('mode', ['process', 'thread'])
+def test_worker_error_is_raised(key_files, mode):
+    keyring = Keyring()
+    keyring.add('1756190', 'E7884956', key_files[0])
+    items = requests(4) + requests(1, 'unknown')
+    with pytest.raises(KeyError):
+        list(sign_many(items, keyring, workers=2, mode=mode, chunksize=1))
+
+
+def test_unknown_mode(key_files):
+    with pytest.raises(ValueError):
+        list(sign_many(requests(1), key_files[0], mode='fiber'))
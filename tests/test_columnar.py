@@ -0,0 +1,148 @@
+import io
+import sys
+from array import array
+from dataclasses import fields
+
+import pytest
+
+from upcpayment import columnar
+from upcpayment.columnar import DictionaryColumn, StringColumn, read_columns, to_columns, write_columns
+from upcpayment.Upc_payment_xml import AuthorizationResponse, TransactionStateResponse
+
+STRINGS = ['', 'a', 'Оплата', '€', 'a&<b>"', '\U0001f600', 'Оплата']
+
+
+def responses(count):
+    return [AuthorizationResponse(merchant_id='1756190', terminal_id='E78849{:02d}'.format(number % 3),
+                                  order_id=str(number), tran_code=('000', '105')[number % 2],
+                                  approval_code='', rrn='{:012d}'.format(number), comment='Оплата №{}'.format(number))
+            for number in range(count)]
+
+
+def round_trip(columns, **kwargs):
+    file = io.BytesIO()
+    write_columns(columns, file)
+    file.seek(0)
+    read = read_columns(file, **kwargs)
+    assert file.read() == b''
+    return read
+
+
+@pytest.mark.parametrize('column_class', [StringColumn, DictionaryColumn])
+@pytest.mark.parametrize('values', [[], [''], STRINGS], ids=['empty', 'empty_string', 'strings'])
+def test_column(column_class, values):
+    column = column_class.encode(values)
+    assert len(column) == len(values)
+    assert list(column) == values
+    assert [column[index] for index in range(len(values))] == values
+    if values:
+        assert column[-1] == values[-1]
+
+
+def test_dictionary_column():
+    column = DictionaryColumn.encode(STRINGS)
+    assert column.values == ['', 'a', 'Оплата', '€', 'a&<b>"', '\U0001f600']
+    assert column.counts() == [1, 1, 2, 1, 1, 1]
+    assert column.codes.typecode == 'B'
+
+
+@pytest.mark.parametrize('size, typecode', [(1, 'B'), (256, 'B'), (257, 'H'), (65536, 'H'), (65537, 'I')])
+def test_code_type(size, typecode):
+    assert columnar._code_type(size) == typecode
+
+
+def test_to_columns():
+    columns = to_columns(responses(10))
+    assert columns.names == [field.name for field in fields(AuthorizationResponse)]
+    assert columns.response_class is AuthorizationResponse and len(columns) == 10
+    encodings = {name: type(columns[name]) for name in columns.names}
+    assert encodings == {'merchant_id': DictionaryColumn, 'terminal_id': DictionaryColumn,
+                         'order_id': StringColumn, 'tran_code': DictionaryColumn,
+                         'approval_code': DictionaryColumn, 'rrn': StringColumn, 'comment': StringColumn,
+                         'host_code': DictionaryColumn}
+    assert columns['tran_code'].values == ['000', '105'] and columns['tran_code'].counts() == [5, 5]
+    assert list(columns.rows())[3] == tuple(getattr(responses(10)[3], name) for name in columns.names)
+    assert columns.to_responses() == responses(10)
+
+
+def test_dictionary_ratio():
+    assert isinstance(to_columns(responses(10), dictionary_ratio=0)['merchant_id'], StringColumn)
+    assert isinstance(to_columns(responses(10), dictionary_ratio=1)['rrn'], DictionaryColumn)
+
+
+def test_to_columns_of_an_iterator():
+    assert to_columns(iter(responses(4))).to_responses() == responses(4)
+
+
+def test_empty():
+    with pytest.raises(ValueError):
+        to_columns([])
+    columns = to_columns([], TransactionStateResponse)
+    assert len(columns) == 0 and list(columns.rows()) == []
+    read = round_trip(columns)
+    assert read.response_class is TransactionStateResponse
+    assert read.names == columns.names and read.to_responses() == []
+
+
+@pytest.mark.parametrize('count', [1, 10, 300])
+def test_round_trip(count):
+    columns = to_columns(responses(count))
+    read = round_trip(columns)
+    assert read.response_class is AuthorizationResponse and len(read) == count
+    assert {name: type(read[name]) for name in read.names} == {name: type(columns[name]) for name in columns.names}
+    assert read.to_responses() == responses(count)
+
+
+def test_round_trip_of_wide_codes():
+    # more than 256 distinct values need 2-byte codes
+    values = ['Оплата {}'.format(number % 300) for number in range(600)]
+    column = DictionaryColumn.encode(values)
+    assert column.codes.typecode == 'H'
+    read = round_trip(columnar.Columns(AuthorizationResponse, {'comment': column}, len(values)))
+    assert read['comment'].codes.typecode == 'H' and list(read['comment']) == values
+
+
+class SwappedArray(array):
+    def tobytes(self):
+        swapped = array(self.typecode, self)
+        swapped.byteswap()
+        return swapped.tobytes()
+
+
+def test_read_other_byteorder(monkeypatch):
+    values = ['Оплата {}'.format(number % 300) for number in range(600)]
+    # written on a machine of the other byte order: the header says so and every array is swapped
+    monkeypatch.setattr(columnar, 'array', SwappedArray)
+    monkeypatch.setattr(columnar, 'sys', type(sys)('sys'))
+    columnar.sys.byteorder = 'big' if sys.byteorder == 'little' else 'little'
+    columns = columnar.Columns(AuthorizationResponse, {'comment': DictionaryColumn.encode(values),
+                                                       'rrn': StringColumn.encode(values)}, len(values))
+    file = io.BytesIO()
+    write_columns(columns, file)
+    monkeypatch.undo()
+    file.seek(0)
+    read = read_columns(file)
+    assert read['comment'].codes.typecode == 'H'
+    assert list(read['comment']) == list(read['rrn']) == values
+
+
+def test_not_a_columns_file():
+    with pytest.raises(ValueError):
+        read_columns(io.BytesIO(b'<ECommerceConnect/>'))
+
+
+def test_file(tmp_path):
+    path = tmp_path / 'responses.col'
+    with open(path, 'wb') as file:
+        write_columns(to_columns(responses(20)), file)
+    with open(path, 'rb') as file:
+        assert read_columns(file, AuthorizationResponse).to_responses() == responses(20)
+
+
+def test_to_numpy():
+    numpy = pytest.importorskip('numpy')
+    columns = to_columns(responses(10))
+    arrays = columns.to_numpy()
+    assert list(arrays['rrn']) == list(columns['rrn'])
+    assert list(arrays['tran_code']) == list(columns['tran_code'])
+    assert list(numpy.bincount(columns['tran_code'].numpy_codes())) == [5, 5]
@@ -0,0 +1,61 @@
+import os
+import threading
+
+from upcpayment.journal import Journal, JournalReader
+
+
+def documents(reader):
+    return [entry.document for entry in reader.unacknowledged()]
+
+
+def test_unacknowledged_entries_are_replayed(tmp_path):
+    with Journal(str(tmp_path)) as journal:
+        first = journal.append(b'<first/>', order_id='1')
+        journal.append(b'<second/>', order_id='2', message_type='RefundRequest')
+        journal.acknowledge(first, sync=True)
+    with JournalReader(str(tmp_path)) as reader:
+        assert documents(reader) == [b'<second/>']
+        assert reader.find('2')[0].message_type == 'RefundRequest'
+
+
+def test_seqs_are_not_reused_after_prune(tmp_path):
+    directory = str(tmp_path)
+    with Journal(directory, segment_size=300) as journal:
+        for seq in (journal.append(b'<a/>' * 60), journal.append(b'<b/>' * 60)):
+            journal.acknowledge(seq, sync=True)
+        # both entries acknowledged: only the segment with the acks is left
+        assert len(journal.prune()) == 2
+    with Journal(directory, segment_size=300) as journal:
+        seqs = [journal.append(b'<c/>'), journal.append(b'<d/>')]
+    assert seqs == [3, 4]
+    with JournalReader(directory) as reader:
+        assert documents(reader) == [b'<c/>', b'<d/>']
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    directory = str(tmp_path)
+    with Journal(directory) as journal:
+        journal.append(b'<whole/>')
+    path = os.path.join(directory, sorted(os.listdir(directory))[-1])
+    with open(path, 'ab') as segment:
+        segment.write(b'\x00\x01torn')
+    with Journal(directory) as journal:
+        assert journal.append(b'<next/>') == 2
+    with JournalReader(directory) as reader:
+        assert documents(reader) == [b'<whole/>', b'<next/>']
+
+
+def test_concurrent_appends_share_syncs(tmp_path):
+    with Journal(str(tmp_path), segment_size=4096) as journal:
+        def append(number):
+            for count in range(50):
+                journal.append(b'<request n="%d-%d"/>' % (number, count))
+        threads = [threading.Thread(target=append, args=(number,)) for number in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert journal.syncs <= 400
+    with JournalReader(str(tmp_path)) as reader:
+        assert len(reader) == 400
+        assert [entry.seq for entry in reader.entries()] == list(range(1, 401))
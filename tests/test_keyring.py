@@ -0,0 +1,88 @@
+import os
+import shutil
+
+import pytest
+
+from upcpayment.samples import generate_key_file
+from upcpayment.keyring import Keyring, load_private_key
+
+
+def public_numbers(key):
+    return key.public_key().public_numbers()
+
+
+def test_key_is_parsed_once(key_files):
+    keyring = Keyring()
+    entry = keyring.add('m', 't', key_files[0])
+    assert keyring.entry('m', 't') is entry
+    assert entry.key is keyring.get_key('m', 't')
+    assert ('m', 't') in keyring and len(keyring) == 1
+
+
+def test_rotated_key_file_is_reloaded(tmp_path):
+    old_key, _ = generate_key_file(tmp_path, 'old')
+    new_key, _ = generate_key_file(tmp_path, 'new')
+    path = str(tmp_path / 'merchant.pem')
+    shutil.copy(old_key, path)
+
+    keyring = Keyring()
+    keyring.add('m', 't', path)
+    before = keyring.get_key('m', 't')
+    assert public_numbers(before) == public_numbers(load_private_key(old_key))
+
+    expected = public_numbers(Keyring().load(new_key))
+    os.replace(new_key, path)
+    after = keyring.get_key('m', 't')
+    assert after is not before
+    assert public_numbers(after) == expected
+    assert keyring.get_key('m', 't') is after
+
+
+def test_key_file_rewritten_in_place_is_reloaded(tmp_path):
+    old_key, _ = generate_key_file(tmp_path, 'old')
+    new_key, _ = generate_key_file(tmp_path, 'new')
+    path = str(tmp_path / 'merchant.pem')
+    shutil.copy(old_key, path)
+
+    keyring = Keyring()
+    before = keyring.load(path)
+    with open(new_key, 'rb') as source, open(path, 'wb') as target:
+        target.write(source.read())
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000000000))
+
+    assert public_numbers(keyring.load(path)) != public_numbers(before)
+
+
+def test_missing_key_file(tmp_path):
+    keyring = Keyring()
+    keyring.add('m', 't', str(tmp_path / 'missing.pem'))
+    with pytest.raises(FileNotFoundError):
+        keyring.get_key('m', 't')
+
+
+def test_least_recently_used_key_is_dropped(tmp_path):
+    paths = [generate_key_file(tmp_path, name)[0] for name in ('a', 'b', 'c')]
+    keyring = Keyring(maxsize=2)
+    first = keyring.load(paths[0])
+    keyring.load(paths[1])
+    keyring.load(paths[0])
+    keyring.load(paths[2])
+    assert keyring.load(paths[0]) is first
+    assert list(keyring._keys) == [paths[2], paths[0]]
+
+
+def test_remove_keeps_key_shared_with_another_entry(key_files):
+    keyring = Keyring()
+    keyring.add('m', 't1', key_files[0])
+    keyring.add('m', 't2', key_files[0])
+    key = keyring.get_key('m', 't1')
+
+    keyring.remove('m', 't1')
+    assert ('m', 't1') not in keyring
+    assert keyring.get_key('m', 't2') is key
+
+    keyring.remove('m', 't2')
+    assert key_files[0] not in keyring._keys
+    with pytest.raises(KeyError):
+        keyring.entry('m', 't2')
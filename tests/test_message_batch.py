@@ -0,0 +1,58 @@
+import pytest
+
+from upcpayment.exceptions import InvalidInput
+from upcpayment.message_batch import MessageBatch
+from upcpayment.samples import sample_request
+from upcpayment.signer import EnvelopedSigner
+from upcpayment.simulator import GatewaySimulator
+from upcpayment.Upc_payment_xml import PostAuthorizationRequest, RefundRequest
+
+
+@pytest.fixture(scope='module')
+def signer(key_files):
+    return EnvelopedSigner(key_files[0])
+
+
+def batch():
+    return MessageBatch([sample_request(RefundRequest, order_id='1'),
+                         sample_request(PostAuthorizationRequest, order_id='2')], message_id='batch')
+
+
+def response(signer, *results):
+    data = ''.join('<TransactionResult{}><OrderID>{}</OrderID><TranCode>{}</TranCode></TransactionResult>'.format(
+        ' id="{}"'.format(result_id) if result_id else '', order_id, tran_code)
+        for result_id, order_id, tran_code in results)
+    canonical = ('<ECommerceConnect><Message id="batch" version="1.0"><XMLPayResponse><ResponseData>'
+                 '<MerchantID>1756190</MerchantID><TerminalID>E7884956</TerminalID>{}'
+                 '</ResponseData></XMLPayResponse></Message></ECommerceConnect>').format(data)
+    return signer.sign_canonical(canonical.encode('ascii'))
+
+
+def test_round_trip_through_simulator(key_files):
+    requests = batch()
+    simulator = GatewaySimulator(key_files[0], key_files[1], tran_codes={'000': 1})
+    responses = requests.parse_response(simulator.respond(requests.generate_xml_with_signature(key_files[0])),
+                                        key_files[1])
+    assert [(response.order_id, response.tran_code) for response in responses] == [('1', '000'), ('2', '000')]
+    assert responses[0].merchant_id == '1756190'
+
+
+def test_matched_by_id_in_any_order(signer, key_files):
+    responses = batch().parse_response(response(signer, ('2', '2', '105'), ('1', '1', '000')), key_files[1])
+    assert [(response.order_id, response.tran_code) for response in responses] == [('1', '000'), ('2', '105')]
+
+
+def test_matched_by_position_without_ids(signer, key_files):
+    responses = batch().parse_response(response(signer, ('', '', '000'), ('', '', '105')), key_files[1])
+    assert [response.tran_code for response in responses] == ['000', '105']
+
+
+@pytest.mark.parametrize('results', [
+    (('1', '1', '000'), ('3', '3', '105')),
+    (('1', '1', '000'), ('', '', '105')),
+    (('1', '1', '000'),),
+    (('', '', '000'),),
+])
+def test_unmatched_results_are_rejected(signer, key_files, results):
+    with pytest.raises(InvalidInput):
+        batch().parse_response(response(signer, *results), key_files[1])
@@ -0,0 +1,104 @@
+import asyncio
+import base64
+import io
+from urllib.parse import urlencode
+
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from upcpayment.exceptions import AltCurrencyAmountNullException, InvalidInput, InvalidSignature
+from upcpayment.keyring import load_private_key
+from upcpayment.notification import NotificationVerifier, parse_notification
+from upcpayment.Upc_payment import Upc_payment
+
+FORM = {'MerchantID': '1756190', 'TerminalID': 'E7884956', 'OrderID': '1234', 'PurchaseTime': '101020121000',
+        'Currency': '980', 'TotalAmount': '10000', 'XID': 'MDAwMDAwMDAwMDAx', 'TranCode': '000',
+        'ApprovalCode': 'A1B2C3', 'Rrn': '123456789012', 'SD': 'session', 'Signature': ''}
+
+
+def signed_form(key_path, **values):
+    form = dict(FORM, **values)
+    data = parse_notification(form).signed_data().encode('utf-8')
+    signature = load_private_key(key_path).sign(data, padding.PKCS1v15(), hashes.SHA1())
+    form['Signature'] = base64.b64encode(signature).decode('ascii')
+    return form
+
+
+def payment(form):
+    payment = Upc_payment(form['MerchantID'], form['TerminalID'], form['TotalAmount'], form['Currency'], 'uk',
+                          form['OrderID'], 'description', sd=form['SD'], delay=form.get('Delay', ''),
+                          alt_currency=form.get('AltCurrency', ''), alt_total_amount=form.get('AltTotalAmount', ''))
+    payment.purchase_time = form['PurchaseTime']
+    return payment
+
+
+@pytest.mark.parametrize('values', [{}, {'Delay': '1'}, {'AltCurrency': '840', 'AltTotalAmount': '270'}])
+def test_same_data_as_check_response_signature(key_files, values):
+    form = signed_form(key_files[0], **values)
+    assert NotificationVerifier(key_files[1]).verify(urlencode(form).encode('ascii')).order_id == '1234'
+    assert payment(form).check_response_signature(key_files[1], form['XID'], form['TranCode'],
+                                                  form['ApprovalCode'], form['Signature'])
+
+
+@pytest.mark.parametrize('values', [{'AltCurrency': '840'}, {'AltTotalAmount': '270'}])
+def test_alt_amount_without_alt_currency_is_rejected(key_files, values):
+    form = dict(FORM, **values)
+    with pytest.raises(AltCurrencyAmountNullException):
+        parse_notification(form).signed_data()
+    with pytest.raises(AltCurrencyAmountNullException):
+        payment(form).check_response_signature(key_files[1], form['XID'], form['TranCode'], form['ApprovalCode'],
+                                               form['Signature'])
+    with pytest.raises(InvalidInput):
+        NotificationVerifier(key_files[1]).verify(form)
+
+
+def wsgi_call(app, body):
+    answers = []
+    environ = {'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body)}
+    body = b''.join(app(environ, lambda status, headers: answers.append(status)))
+    return answers[0], body
+
+
+def test_wsgi_app(key_files):
+    app = NotificationVerifier(key_files[1]).wsgi_app(lambda notification: 'OK ' + notification.order_id)
+    form = signed_form(key_files[0])
+    assert wsgi_call(app, urlencode(form).encode('ascii')) == ('200 OK', b'OK 1234')
+    assert wsgi_call(app, urlencode(dict(form, TranCode='105')).encode('ascii'))[0] == '403 Forbidden'
+    assert wsgi_call(app, b'OrderID=\xff\xfe')[0] == '400 Bad Request'
+    assert wsgi_call(app, b'OrderID=1')[0] == '400 Bad Request'
+
+
+def asgi_call(app, scope, messages):
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+    asyncio.run(app(scope, receive, send))
+    return sent
+
+
+def test_asgi_app(key_files):
+    async def handler(notification):
+        return 'OK ' + notification.order_id
+    app = NotificationVerifier(key_files[1]).asgi_app(handler)
+    body = urlencode(signed_form(key_files[0])).encode('ascii')
+    sent = asgi_call(app, {'type': 'http'}, [{'type': 'http.request', 'body': body[:10], 'more_body': True},
+                                             {'type': 'http.request', 'body': body[10:]}])
+    assert (sent[0]['status'], sent[1]['body']) == (200, b'OK 1234')
+    sent = asgi_call(app, {'type': 'http'}, [{'type': 'http.request', 'body': b'\xff'}])
+    assert sent[0]['status'] == 400
+
+    sent = asgi_call(app, {'type': 'lifespan'}, [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+    assert [message['type'] for message in sent] == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    with pytest.raises(ValueError):
+        asgi_call(app, {'type': 'websocket'}, [{'type': 'websocket.connect'}])
+
+
+def test_forged_notification(key_files):
+    form = signed_form(key_files[0])
+    with pytest.raises(InvalidSignature):
+        NotificationVerifier(key_files[1]).verify(dict(form, TotalAmount='1'))
@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+import pathlib
+from dataclasses import fields
+
+import pytest
+
+from upcpayment.exceptions import GatewayError
+from upcpayment.pipeline import process_settlement_refunds, read_rows
+from upcpayment.samples import sample_request
+from upcpayment.Upc_payment_xml import SettlementRefundRequest, SettlementRefundResponse
+
+NAMES = [field.name for field in fields(SettlementRefundRequest)]
+REQUESTS = [sample_request(SettlementRefundRequest, order_id='order-{}'.format(number), purchase_desc='Повернення')
+            for number in range(7)]
+
+
+def write_csv(path):
+    with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+        writer = csv.DictWriter(csv_file, NAMES)
+        writer.writeheader()
+        for request in REQUESTS:
+            writer.writerow({name: getattr(request, name) for name in NAMES})
+    return path
+
+
+def lines(sink):
+    return [json.loads(line) for line in sink.getvalue().splitlines()]
+
+
+class Sink(io.StringIO):
+    """
+    Keeps the text that was flushed, as a file would after a crash.
+    """
+    flushed = ''
+
+    def flush(self):
+        self.flushed = self.getvalue()
+
+
+def test_read_rows_from_csv_and_ndjson(tmp_path):
+    path = write_csv(tmp_path / 'refunds.csv')
+    assert [row['order_id'] for row in read_rows(path, start_row=5)] == ['order-5', 'order-6']
+
+    ndjson = io.StringIO(''.join(json.dumps({'order_id': request.order_id}) + '\n\n' for request in REQUESTS))
+    assert [row['order_id'] for row in read_rows(ndjson, 'ndjson', 6)] == ['order-6']
+    with pytest.raises(ValueError):
+        list(read_rows(io.StringIO(''), 'xml'))
+
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_signed_rows(tmp_path, key_files, workers):
+    path = write_csv(tmp_path / 'refunds.csv')
+    sink = io.StringIO()
+    assert process_settlement_refunds(pathlib.Path(path), sink, key_files[0], workers=workers) == len(REQUESTS)
+    assert lines(sink) == [{'row': number, 'order_id': request.order_id,
+                            'xml': request.generate_xml_with_signature(key_files[0]).decode('utf-8')}
+                           for number, request in enumerate(REQUESTS)]
+
+
+def test_progress_and_resume(tmp_path, key_files):
+    path = str(write_csv(tmp_path / 'refunds.csv'))
+    sink, checkpoints = Sink(), []
+    process_settlement_refunds(path, sink, key_files[0], progress=checkpoints.append, progress_every=3)
+    assert checkpoints == [3, 6, 7]
+    assert [json.loads(line)['row'] for line in sink.flushed.splitlines()] == list(range(7))
+
+    resumed = io.StringIO()
+    assert process_settlement_refunds(path, resumed, key_files[0], start_row=3) == 7
+    assert lines(resumed) == lines(sink)[3:]
+
+
+def test_sent_row_is_checkpointed_before_it_is_sent(tmp_path):
+    path = str(write_csv(tmp_path / 'refunds.csv'))
+    sinks, checkpoints, sent = [Sink()], [], []
+
+    def send(request):
+        # the row is on disk and checkpointed before the gateway sees it
+        assert json.loads(sinks[-1].flushed.splitlines()[-1]) == {'row': len(sent), 'order_id': request.order_id,
+                                                                  'sending': True}
+        assert checkpoints[-1] == len(sent) + 1
+        sent.append(request.order_id)
+        if len(sent) == 3:
+            raise GatewayError('Connection reset')
+        return SettlementRefundResponse(request.merchant_id, request.terminal_id, '000', 'Approved')
+
+    with pytest.raises(GatewayError):
+        process_settlement_refunds(path, sinks[-1], send=send, progress=checkpoints.append)
+    assert checkpoints == [1, 2, 3]
+    assert lines(sinks[-1])[-2:] == [
+        {'merchant_id': '1756190', 'terminal_id': 'E7884956', 'tran_code': '000', 'comment': 'Approved', 'row': 1},
+        {'row': 2, 'order_id': 'order-2', 'sending': True},
+    ]
+
+    # the refund of row 2 may have reached the gateway, it is not sent again
+    sinks.append(Sink())
+    assert process_settlement_refunds(path, sinks[-1], send=send, start_row=checkpoints[-1],
+                                      progress=checkpoints.append) == 7
+    assert sent == ['order-{}'.format(number) for number in range(7)]
+    assert [line['row'] for line in lines(sinks[-1])] == [3, 3, 4, 4, 5, 5, 6, 6]
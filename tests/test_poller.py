@@ -0,0 +1,73 @@
+import asyncio
+from dataclasses import fields
+
+import pytest
+
+from upcpayment.exceptions import GatewayError, InvalidSignature, PollingIncomplete
+from upcpayment.poller import poll_states, poll_states_threaded
+from upcpayment.samples import sample_request
+from upcpayment.Upc_payment_xml import TransactionStateRequest, TransactionStateResponse
+
+
+def state(request, tran_code):
+    values = {field.name: getattr(request, field.name, '') for field in fields(TransactionStateResponse)}
+    return TransactionStateResponse(**dict(values, tran_code=tran_code))
+
+
+class FakeGateway(object):
+    """
+    Order '0' is approved at once, '1' after one connection error, '2' stays
+    pending and '3' has a forged response.
+    """
+    def __init__(self):
+        self.calls = {}
+
+    def send(self, request):
+        calls = self.calls[request.order_id] = self.calls.get(request.order_id, 0) + 1
+        if request.order_id == '1' and calls == 1:
+            raise GatewayError('Gateway answered with HTTP 503')
+        if request.order_id == '2':
+            return state(request, '')
+        if request.order_id == '3':
+            raise InvalidSignature('Response signature is not valid')
+        return state(request, '000')
+
+    async def send_async(self, request):
+        await asyncio.sleep(0)
+        return self.send(request)
+
+
+REQUESTS = [sample_request(TransactionStateRequest, order_id=str(number)) for number in range(4)]
+
+
+def check(gateway, responses, incomplete):
+    assert sorted(response.order_id for response in responses) == ['0', '1']
+    assert [request.order_id for request in incomplete.pending] == ['2']
+    assert [(request.order_id, type(exc)) for request, exc in incomplete.failed] == [('3', InvalidSignature)]
+    assert gateway.calls['3'] == 1
+
+
+def test_poll_states():
+    gateway = FakeGateway()
+    responses = []
+
+    async def run():
+        async for response in poll_states(REQUESTS, gateway.send_async, interval=0.01, timeout=0.3):
+            responses.append(response)
+    with pytest.raises(PollingIncomplete) as incomplete:
+        asyncio.run(run())
+    check(gateway, responses, incomplete.value)
+
+
+def test_poll_states_threaded():
+    gateway = FakeGateway()
+    responses = []
+    with pytest.raises(PollingIncomplete) as incomplete:
+        for response in poll_states_threaded(REQUESTS, gateway.send, interval=0.01, timeout=0.3):
+            responses.append(response)
+    check(gateway, responses, incomplete.value)
+
+
+def test_all_final():
+    gateway = FakeGateway()
+    assert len(list(poll_states_threaded(REQUESTS[:2], gateway.send, interval=0.01))) == 2
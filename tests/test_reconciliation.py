@@ -0,0 +1,90 @@
+import csv
+
+import pytest
+
+from upcpayment.reconciliation import (AMOUNT_MISMATCH, MATCHED, MISSING_IN_RESPONSES, MISSING_IN_STATEMENT,
+                                       reconcile)
+from upcpayment.Upc_payment_xml import AuthorizationResponse
+
+INDEXES = ['responses', 'statement']
+
+
+def response(order_id, rrn='', approval_code='', tran_code='000'):
+    return AuthorizationResponse(merchant_id='1756190', terminal_id='E7884956', order_id=order_id,
+                                 tran_code=tran_code, approval_code=approval_code, rrn=rrn, comment='Approved')
+
+
+def statuses(results):
+    """
+    {status: sorted [(order_id of the response, order_id of the row)]}, independent of the yield order.
+    """
+    found = {}
+    for status, matched_response, row in results:
+        found.setdefault(status, []).append((matched_response and matched_response.order_id,
+                                             row and row['order_id']))
+    return {status: sorted(pairs, key=str) for status, pairs in found.items()}
+
+
+@pytest.mark.parametrize('index', INDEXES)
+def test_statuses(index):
+    responses = [(response('1', rrn='r1'), '100'),
+                 (response('2', rrn='r2'), '200'),
+                 (response('3', rrn='r3'), '300'),
+                 response('4', rrn='r4')]
+    statement = [{'order_id': '1', 'rrn': 'r1', 'amount': '100.00'},
+                 {'order_id': '2', 'rrn': 'r2', 'amount': '250'},
+                 {'order_id': '4', 'rrn': 'r4', 'amount': '400'},
+                 {'order_id': '5', 'rrn': 'r5', 'amount': '500'}]
+    assert statuses(reconcile(responses, statement, index=index)) == {
+        MATCHED: [('1', '1'), ('4', '4')],
+        AMOUNT_MISMATCH: [('2', '2')],
+        MISSING_IN_STATEMENT: [('3', None)],
+        MISSING_IN_RESPONSES: [(None, '5')],
+    }
+
+
+@pytest.mark.parametrize('index', INDEXES)
+def test_later_keys_are_tried_and_must_agree(index):
+    responses = [response('1', approval_code='A1'),
+                 response('2', rrn='r2', approval_code='SHARED'),
+                 response('3', rrn='r3', approval_code='SHARED')]
+    statement = [{'order_id': '1', 'approval_code': 'A1'},
+                 # the approval code is shared, the rrn tells the orders apart
+                 {'order_id': '3', 'rrn': 'r3', 'approval_code': 'SHARED'},
+                 # same approval code, but a different order id
+                 {'order_id': '9', 'approval_code': 'SHARED'}]
+    assert statuses(reconcile(responses, statement, index=index)) == {
+        MATCHED: [('1', '1'), ('3', '3')],
+        MISSING_IN_STATEMENT: [('2', None)],
+        MISSING_IN_RESPONSES: [(None, '9')],
+    }
+
+
+@pytest.mark.parametrize('index', INDEXES)
+def test_each_item_matches_once(index):
+    responses = [response('1', rrn='r1'), response('1', rrn='r1')]
+    statement = [{'order_id': '1', 'rrn': 'r1'}] * 3
+    assert statuses(reconcile(responses, statement, index=index)) == {
+        MATCHED: [('1', '1'), ('1', '1')],
+        MISSING_IN_RESPONSES: [(None, '1')],
+    }
+
+
+@pytest.mark.parametrize('index', INDEXES)
+def test_statement_file_and_column_names(tmp_path, index):
+    path = tmp_path / 'statement.csv'
+    with open(path, 'w', newline='') as statement_file:
+        writer = csv.writer(statement_file)
+        writer.writerow(['OrderID', 'RRN', 'Sum'])
+        writer.writerow(['1', 'r1', '100'])
+        writer.writerow(['2', 'r2', '99'])
+    responses = [(response('1', rrn='r1'), '100'), (response('2', rrn='r2'), '100')]
+    results = list(reconcile(responses, path, columns={'order_id': 'OrderID', 'rrn': 'RRN'},
+                             amount_column='Sum', index=index))
+    assert sorted((status, matched_response.order_id, row['OrderID']) for status, matched_response, row in results) \
+        == [(AMOUNT_MISMATCH, '2', '2'), (MATCHED, '1', '1')]
+
+
+def test_unknown_index():
+    with pytest.raises(ValueError):
+        list(reconcile([], [], index='both'))
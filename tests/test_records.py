@@ -0,0 +1,67 @@
+import copy
+import pickle
+from dataclasses import MISSING, FrozenInstanceError, fields, replace
+
+import pytest
+
+from upcpayment import Upc_payment_xml
+from upcpayment.Upc_payment_xml import AuthorizationResponse, SettlementRefundRequest
+
+RECORD_CLASSES = sorted({cls for pair in Upc_payment_xml._RESPONSE_CLASSES.items() for cls in pair},
+                        key=lambda cls: cls.__name__)
+
+
+def response():
+    return AuthorizationResponse(**{field.name: field.name for field in fields(AuthorizationResponse)})
+
+
+def test_no_dict():
+    assert not hasattr(response(), '__dict__')
+
+
+@pytest.mark.parametrize('name', ['tran_code', 'not_a_field'])
+def test_frozen(name):
+    record = response()
+    with pytest.raises(FrozenInstanceError):
+        setattr(record, name, 'x')
+    with pytest.raises(FrozenInstanceError):
+        delattr(record, name)
+
+
+def test_constructors_pickle_and_replace():
+    record = response()
+    values = tuple(getattr(record, field.name) for field in fields(record))
+    assert AuthorizationResponse.from_row(values) == record
+    assert AuthorizationResponse.from_records([values, dict(zip(values, values))]) == [record, record]
+    assert pickle.loads(pickle.dumps(record)) == record == copy.deepcopy(record)
+    assert replace(record, tran_code='000').tran_code == '000'
+
+
+@pytest.mark.parametrize('cls', RECORD_CLASSES, ids=lambda cls: cls.__name__)
+def test_bulk_constructors_build_frozen_instances(cls):
+    names = [field.name for field in fields(cls)]
+    row = tuple('{}-value'.format(name) for name in names)
+    expected = cls(*row)
+    built = [cls.from_row(row)] + cls.from_records([row, list(row), dict(zip(names, row))])
+    assert built == [expected] * 4
+    for record in built:
+        assert type(record) is cls and not hasattr(record, '__dict__')
+        with pytest.raises(FrozenInstanceError):
+            setattr(record, names[0], 'x')
+        assert pickle.loads(pickle.dumps(record)) == expected
+
+
+def test_bulk_constructors_use_defaults_and_reject_bad_rows():
+    required = [field.name for field in fields(SettlementRefundRequest) if field.default is MISSING]
+    row = tuple(required)
+    expected = SettlementRefundRequest(*row)
+    assert expected.rrn == ''
+    assert SettlementRefundRequest.from_row(row) == expected
+    assert SettlementRefundRequest.from_records([row, dict(zip(required, row))]) == [expected, expected]
+
+    with pytest.raises(TypeError):
+        SettlementRefundRequest.from_row(row[:-1])
+    with pytest.raises(TypeError):
+        SettlementRefundRequest.from_records([dict(zip(required, row), unknown='x')])
+    with pytest.raises(TypeError):
+        SettlementRefundRequest.from_records([dict(zip(required[:-1], row))])
@@ -0,0 +1,96 @@
+import io
+from dataclasses import fields
+
+import pytest
+from lxml import etree
+
+from upcpayment import Upc_payment_xml
+from upcpayment.samples import sample_request
+from upcpayment.signer import EnvelopedSigner
+from upcpayment.truststore import TrustStore
+
+REQUEST_CLASSES = list(Upc_payment_xml._RESPONSE_CLASSES)
+
+
+def document(response_data):
+    return ('<ECommerceConnect><Message id="1234" version="1.0"><XMLPayResponse><ResponseData>{}'
+            '</ResponseData></XMLPayResponse></Message></ECommerceConnect>').format(response_data)
+
+
+def full_response(response_class):
+    return document(''.join('<{0}>{1}-Ж&amp;</{0}>'.format(Upc_payment_xml._RESPONSE_TAGS[field.name], field.name)
+                            for field in fields(response_class)))
+
+
+@pytest.fixture(scope='module')
+def sign(key_files):
+    signer = EnvelopedSigner(key_files[0])
+    return lambda canonical: signer.sign_canonical(canonical.encode('utf-8'))
+
+
+@pytest.fixture(scope='module')
+def trust_store(key_files):
+    return TrustStore(key_files[1])
+
+
+def xpath_fields(signed, response_class):
+    # string() of the first matching element, as the fields were read before the single iter() pass
+    root = etree.fromstring(signed)
+    return {field.name: root.xpath('string(//{})'.format(Upc_payment_xml._RESPONSE_TAGS[field.name]))
+            for field in fields(response_class)}
+
+
+@pytest.mark.parametrize('request_class', REQUEST_CLASSES, ids=lambda request_class: request_class.__name__)
+def test_lazy_and_eager_parsing_agree(sign, trust_store, request_class):
+    response_class = Upc_payment_xml._RESPONSE_CLASSES[request_class]
+    signed = sign(full_response(response_class))
+    request = sample_request(request_class)
+
+    eager = Upc_payment_xml.parse_response(request, signed, trust_store)
+    view = Upc_payment_xml.parse_response(request, signed, trust_store, lazy=True)
+    assert type(eager) is response_class
+    assert eager == response_class(**xpath_fields(signed, response_class))
+    assert view.to_response() == eager
+    for field in fields(response_class):
+        assert getattr(view, field.name) == getattr(eager, field.name) == field.name + '-Ж&'
+    with pytest.raises(AttributeError):
+        view.not_a_field
+
+
+@pytest.mark.parametrize('wrap', [bytes, lambda signed: signed.decode('utf-8'), bytearray, memoryview, io.BytesIO],
+                         ids=['bytes', 'str', 'bytearray', 'memoryview', 'file'])
+def test_response_sources(sign, trust_store, wrap):
+    signed = sign(full_response(Upc_payment_xml.AuthorizationResponse))
+    expected = Upc_payment_xml.AuthorizationResponse_check_sign_and_parse(signed, trust_store)
+    assert Upc_payment_xml.AuthorizationResponse_check_sign_and_parse(wrap(signed), trust_store) == expected
+    view = Upc_payment_xml.AuthorizationResponse_check_sign_and_parse(wrap(signed), trust_store, lazy=True)
+    assert view.to_response() == expected
+
+
+@pytest.mark.parametrize('response_data, expected', [
+    # duplicate tags: the first one wins
+    ('<TranCode>000</TranCode><TranCode>105</TranCode><Rrn>1</Rrn><Rrn>2</Rrn>',
+     {'tran_code': '000', 'rrn': '1'}),
+    # a field nested deeper comes first in document order
+    ('<Extra><Rrn>nested</Rrn></Extra><Rrn>top</Rrn><TranCode>000</TranCode>',
+     {'tran_code': '000', 'rrn': 'nested'}),
+    # the text of an element with children is all of its text, like XPath string()
+    ('<Comment>Approved <b>by</b> issuer</Comment><TranCode></TranCode>',
+     {'comment': 'Approved by issuer', 'tran_code': ''}),
+    # missing fields are empty
+    ('<OrderID>1234</OrderID>', {'order_id': '1234', 'tran_code': '', 'merchant_id': ''}),
+], ids=['duplicate', 'nested', 'mixed', 'missing'])
+def test_first_occurrence_wins(sign, trust_store, response_data, expected):
+    signed = sign(document(response_data))
+    response_class = Upc_payment_xml.AuthorizationResponse
+    eager = Upc_payment_xml.AuthorizationResponse_check_sign_and_parse(signed, trust_store)
+    view = Upc_payment_xml.AuthorizationResponse_check_sign_and_parse(signed, trust_store, lazy=True)
+    assert eager == response_class(**xpath_fields(signed, response_class))
+    assert view.to_response() == eager
+    for name, value in expected.items():
+        assert getattr(eager, name) == getattr(view, name) == value
+
+
+def test_unsupported_source(trust_store):
+    with pytest.raises(TypeError):
+        Upc_payment_xml.AuthorizationResponse_check_sign_and_parse(12345, trust_store)
@@ -0,0 +1,35 @@
+import pytest
+from lxml import etree
+
+from upcpayment import Upc_payment_xml
+from upcpayment.samples import sample_request
+from upcpayment.serializer import serialize
+
+REQUEST_CLASSES = list(Upc_payment_xml._RESPONSE_CLASSES)
+
+# values that c14n has to escape, and non-ASCII text
+SPECIAL_VALUES = [
+    {},
+    {'order_id': 'a&b<c>"d\'e', 'purchase_desc': 'x & y < z > "w"'},
+    {'order_id': 'tab\there\nline\rret', 'purchase_desc': 'line\r\nbreak\ttab'},
+    {'order_id': 'Замовлення-1', 'purchase_desc': 'Оплата замовлення №1 — ґудзики'},
+    {'cv_num': '', 'upctoken': 'token-1', 'tavv': ''},
+]
+
+
+def tree_c14n(request):
+    return etree.tostring(request.generate_xml(), method='c14n', exclusive=True)
+
+
+@pytest.mark.parametrize('values', SPECIAL_VALUES)
+@pytest.mark.parametrize('request_class', REQUEST_CLASSES, ids=lambda request_class: request_class.__name__)
+def test_serialize_matches_tree_c14n(request_class, values):
+    request = sample_request(request_class, **values)
+    assert serialize(request) == tree_c14n(request)
+
+
+@pytest.mark.parametrize('request_class', REQUEST_CLASSES, ids=lambda request_class: request_class.__name__)
+def test_serialize_with_namespaces_parses_to_the_same_c14n(request_class):
+    request = sample_request(request_class, purchase_desc='Оплата & <знижка>')
+    root = etree.fromstring(serialize(request, canonical=False))
+    assert etree.tostring(root, method='c14n', exclusive=True) == tree_c14n(request)
@@ -0,0 +1,96 @@
+import socketserver
+import threading
+import time
+
+import pytest
+
+from upcpayment.exceptions import GatewayError
+from upcpayment.session import GatewaySession
+
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    """
+    Keep-alive HTTP server answering every POST with its body; the
+    connection of request numbers (from 1) in `drop` is closed after the
+    request was read, without an answer; with `close_idle` every connection
+    is closed after one answer.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop=(), close_idle=False):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.drop = set(drop)
+        self.close_idle = close_idle
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.url = 'http://127.0.0.1:{}/xmlpay'.format(self.server_address[1])
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        while True:
+            if not self.rfile.readline():
+                return
+            length = 0
+            while True:
+                line = self.rfile.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.partition(b':')
+                if name.strip().lower() == b'content-length':
+                    length = int(value)
+            body = self.rfile.read(length)
+            with server.lock:
+                server.requests += 1
+                number = server.requests
+            if number in server.drop:
+                return
+            self.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+            if server.close_idle:
+                return
+
+
+def session(server, key_files, **options):
+    return GatewaySession(server.url, key_files[0], key_files[1], backoff=0, **options)
+
+
+def test_requests_reuse_one_connection(key_files):
+    with StandInServer() as server, session(server, key_files) as gateway:
+        assert [gateway.post(b'%d' % number) for number in range(5)] == [b'%d' % number for number in range(5)]
+    assert server.connections == 1
+
+
+def test_unanswered_request_is_not_sent_again(key_files):
+    with StandInServer(drop={2}) as server, session(server, key_files) as gateway:
+        gateway.post(b'first')
+        with pytest.raises(GatewayError):
+            gateway.post(b'second')
+    assert server.requests == 2
+
+
+def test_unanswered_idempotent_request_is_sent_again(key_files):
+    with StandInServer(drop={2}) as server, session(server, key_files) as gateway:
+        gateway.post(b'first')
+        assert gateway.post(b'second', idempotent=True) == b'second'
+    assert server.requests == 3
+
+
+def test_connection_closed_while_idle_is_replaced(key_files):
+    with StandInServer(close_idle=True) as server, session(server, key_files) as gateway:
+        gateway.post(b'first')
+        time.sleep(0.05)
+        assert gateway.post(b'second') == b'second'
+    assert (server.requests, server.connections) == (2, 2)
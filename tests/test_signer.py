@@ -0,0 +1,95 @@
+import random
+from dataclasses import fields
+
+import pytest
+import signxml
+from lxml import etree
+from OpenSSL import crypto
+
+from upcpayment import Upc_payment_xml
+from upcpayment.samples import sample_request
+from upcpayment.signature_cache import SignatureCache
+from upcpayment.signer import EnvelopedSigner, get_signer
+from upcpayment.Upc_payment import Upc_payment
+
+REQUEST_CLASSES = list(Upc_payment_xml._RESPONSE_CLASSES)
+
+SPECIAL_VALUES = [
+    {},
+    {'order_id': 'a>b&c<d"e', 'purchase_desc': 'x & y < z > "w"'},
+    {'order_id': 'tab\there\nline\rret', 'purchase_desc': 'line\r\nbreak\ttab'},
+    {'order_id': 'Замовлення-1', 'purchase_desc': 'Оплата замовлення №1'},
+    {'merchant_id': '', 'order_id': '', 'purchase_desc': '', 'cavv': '', 'ref3': '', 'rrn': ''},
+]
+
+# characters c14n and lxml.etree.tostring write differently, and plain ones
+ALPHABET = 'aZ09 -<>&"\'\t\r\nЖї№€😀'
+
+
+def random_values(request_class, rng):
+    return {field.name: ''.join(rng.choice(ALPHABET) for _ in range(rng.choice([0, 0, 1, 3, 8])))
+            for field in fields(request_class)}
+
+
+@pytest.fixture(scope='module')
+def signer(key_files):
+    return EnvelopedSigner(key_files[0])
+
+
+@pytest.mark.parametrize('values', SPECIAL_VALUES)
+@pytest.mark.parametrize('request_class', REQUEST_CLASSES, ids=lambda request_class: request_class.__name__)
+def test_sign_matches_signxml(signer, signxml_sign, key_files, request_class, values):
+    request = sample_request(request_class, **values)
+    expected = signxml_sign(request.generate_xml(), key_files[0])
+    assert signer.sign(request) == expected
+
+
+@pytest.mark.parametrize('request_class', REQUEST_CLASSES, ids=lambda request_class: request_class.__name__)
+def test_sign_matches_signxml_for_random_values(signer, signxml_sign, key_files, request_class):
+    rng = random.Random(request_class.__name__)
+    for _ in range(30):
+        request = request_class(**random_values(request_class, rng))
+        expected = signxml_sign(request.generate_xml(), key_files[0])
+        assert signer.sign(request) == expected, request
+
+
+@pytest.mark.parametrize('values', SPECIAL_VALUES)
+def test_signature_verifies_with_signxml(signer, key_files, values):
+    request = sample_request(Upc_payment_xml.AuthorizationRequest, **values)
+    with open(key_files[1]) as cert_file:
+        certificate = cert_file.read()
+    signed_xml = signxml.XMLVerifier().verify(etree.fromstring(signer.sign(request)), x509_cert=certificate).signed_xml
+    assert signed_xml.find('Message').get('id') == request.order_id
+
+
+def test_sign_batch_verifies_with_signxml(signer, key_files):
+    requests = [sample_request(Upc_payment_xml.AuthorizationRequest, order_id='order>{}'.format(number))
+                for number in range(3)]
+    with open(key_files[1]) as cert_file:
+        certificate = cert_file.read()
+    signed_xml = signxml.XMLVerifier().verify(etree.fromstring(signer.sign_batch(requests)),
+                                              x509_cert=certificate).signed_xml
+    assert [transaction.get('id') for transaction in signed_xml.iter('Transaction')] == \
+        [request.order_id for request in requests]
+
+
+def _pkey(key_path):
+    with open(key_path) as key_file:
+        return crypto.load_privatekey(crypto.FILETYPE_PEM, key_file.read())
+
+
+def test_get_signer_is_cached_for_pkey(key_files):
+    pkey = _pkey(key_files[0])
+    assert get_signer(pkey) is get_signer(pkey)
+    assert get_signer(key_files[0]) is get_signer(key_files[0])
+
+
+def test_signature_cache_hits_for_pkey(key_files):
+    pkey = _pkey(key_files[0])
+    cache = SignatureCache()
+    payment = Upc_payment('1756190', 'E7884956', '10000', '980', 'uk', '1234', 'Order description')
+    payment.generate_signature(pkey, cache)
+    first = payment.signature
+    payment.generate_signature(pkey, cache)
+    assert payment.signature == first
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import signal
+import socket
+import stat
+import subprocess
+import sys
+import time
+
+import pytest
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from upcpayment.keyring import load_private_key
+from upcpayment import signing_daemon
+from upcpayment.signing_daemon import SigningClient, SigningDaemon
+
+pytestmark = pytest.mark.skipif(not os.path.isdir('/proc/self'), reason='finds worker processes in /proc')
+
+PACKAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'upcpayment')
+
+
+def children(pid):
+    found = []
+    for name in os.listdir('/proc'):
+        try:
+            with open('/proc/{}/stat'.format(name)) as stat:
+                if int(stat.read().rsplit(')', 1)[1].split()[1]) == pid:
+                    found.append(int(name))
+        except (ValueError, OSError, IndexError):
+            continue
+    return found
+
+
+def alive(pids):
+    return [pid for pid in pids if os.path.exists('/proc/{}'.format(pid))
+            and open('/proc/{}/stat'.format(pid)).read().rsplit(')', 1)[1].split()[0] != 'Z']
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+@pytest.fixture
+def daemon(key_files, tmp_path):
+    path = str(tmp_path / 'signing.sock')
+    process = subprocess.Popen([sys.executable, '-m', 'upcpayment.signing_daemon', path, '--key', key_files[0],
+                                '--workers', '2'], env=dict(os.environ, PYTHONPATH=PACKAGE))
+    assert wait_until(lambda: os.path.exists(path))
+    workers = children(process.pid)
+    yield process, path, workers
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def test_signs_like_the_local_key(daemon, key_files):
+    _, path, _ = daemon
+    client = SigningClient(path)
+    data = b'1756190;E7884956;101020121000;1234;980;10000;;'
+    signature = client.key().sign(data, padding.PKCS1v15(), hashes.SHA1())
+    assert signature == load_private_key(key_files[0]).sign(data, padding.PKCS1v15(), hashes.SHA1())
+    client.close()
+
+
+@pytest.mark.parametrize('signum', [signal.SIGTERM, signal.SIGINT])
+def test_stop_signal_stops_workers_and_removes_socket(daemon, signum):
+    process, path, workers = daemon
+    assert len(workers) >= 2
+    process.send_signal(signum)
+    assert process.wait(10) == 0
+    assert not os.path.exists(path)
+    assert wait_until(lambda: not alive(workers))
+
+
+def test_workers_exit_when_daemon_is_killed(daemon):
+    process, _, workers = daemon
+    process.kill()
+    process.wait()
+    assert wait_until(lambda: not alive(workers))
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_socket_mode(daemon):
+    _, path, _ = daemon
+    assert mode(path) == 0o600
+
+
+@pytest.mark.parametrize('socket_mode', [0o600, 0o660], ids=oct)
+def test_socket_has_its_mode_before_it_listens(key_files, tmp_path, monkeypatch, socket_mode):
+    path = str(tmp_path / 'signing.sock')
+    start_unix_server = signing_daemon.asyncio.start_unix_server
+    seen = []
+
+    async def checked_start_unix_server(client_connected_cb, path=None, *, sock=None, **kwargs):
+        seen.append((mode(sock.getsockname()), sock.getsockopt(socket.SOL_SOCKET, socket.SO_ACCEPTCONN)))
+        return await start_unix_server(client_connected_cb, path, sock=sock, **kwargs)
+    monkeypatch.setattr(signing_daemon.asyncio, 'start_unix_server', checked_start_unix_server)
+
+    async def run():
+        daemon = SigningDaemon(path, key_files[0], workers=1, mode=socket_mode)
+        await daemon.start()
+        try:
+            assert mode(path) == socket_mode
+        finally:
+            daemon.close()
+    asyncio.run(run())
+    # the mode was set while the socket was not listening yet
+    assert seen == [(socket_mode, 0)]
+    assert not os.path.exists(path)
@@ -0,0 +1,213 @@
+import asyncio
+import gc
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields
+
+import pytest
+
+from upcpayment import state_cache
+from upcpayment.exceptions import GatewayError
+from upcpayment.samples import sample_request
+from upcpayment.state_cache import AsyncTransactionStateCache, TransactionStateCache
+from upcpayment.Upc_payment_xml import TransactionStateRequest, TransactionStateResponse
+
+
+def state(request, tran_code):
+    values = {field.name: getattr(request, field.name, '') for field in fields(TransactionStateResponse)}
+    return TransactionStateResponse(**dict(values, tran_code=tran_code))
+
+
+def request(order_id='1'):
+    return sample_request(TransactionStateRequest, order_id=order_id)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(state_cache, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+class Gateway(object):
+    def __init__(self, tran_code='000'):
+        self.tran_code = tran_code
+        self.calls = 0
+
+    def send(self, request):
+        self.calls += 1
+        return state(request, self.tran_code)
+
+    async def send_async(self, request):
+        return self.send(request)
+
+
+def test_concurrent_callers_share_one_request():
+    release, calls = threading.Event(), []
+
+    def send(request):
+        calls.append(request.order_id)
+        assert release.wait(5)
+        return state(request, '000')
+
+    cache = TransactionStateCache(send)
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(cache.get, request()) for _ in range(8)]
+        while cache.misses + cache.coalesced < 8:
+            threading.Event().wait(0.01)
+        release.set()
+        responses = [future.result() for future in futures]
+
+    assert calls == ['1']
+    assert (cache.misses, cache.coalesced) == (1, 7)
+    assert all(response is responses[0] for response in responses)
+
+
+def test_error_is_shared_and_not_cached():
+    release, calls = threading.Event(), []
+
+    def send(request):
+        calls.append(request.order_id)
+        assert release.wait(5)
+        raise GatewayError('Gateway answered with HTTP 503')
+
+    cache = TransactionStateCache(send)
+    with ThreadPoolExecutor(3) as executor:
+        futures = [executor.submit(cache.get, request()) for _ in range(3)]
+        while cache.misses + cache.coalesced < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for future in futures:
+            with pytest.raises(GatewayError):
+                future.result()
+    assert len(calls) == 1 and len(cache) == 0
+
+    with pytest.raises(GatewayError):
+        cache.get(request())
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize('tran_code, ttl', [('000', 300), ('', 2), ('101', 2)])
+def test_ttl(clock, tran_code, ttl):
+    gateway = Gateway(tran_code)
+    cache = TransactionStateCache(gateway.send, final_ttl=300, pending_ttl=2, pending_codes=('101',))
+    cache.get(request())
+    clock[0] += ttl - 0.5
+    cache.get(request())
+    assert (gateway.calls, cache.hits) == (1, 1)
+    clock[0] += 1
+    cache.get(request())
+    assert gateway.calls == 2
+
+
+def test_zero_ttl_is_not_cached(clock):
+    gateway = Gateway('')
+    cache = TransactionStateCache(gateway.send, pending_ttl=0)
+    cache.get(request())
+    cache.get(request())
+    assert gateway.calls == 2 and len(cache) == 0
+
+
+def test_maxsize_and_invalidate():
+    gateway = Gateway()
+    cache = TransactionStateCache(gateway.send, maxsize=2)
+    for order_id in ('1', '2', '1', '3'):
+        cache.get(request(order_id))
+    assert gateway.calls == 3 and len(cache) == 2
+    cache.get(request('2'))
+    assert gateway.calls == 4
+
+    first = request('1')
+    cache.invalidate(first.merchant_id, first.terminal_id, first.order_id)
+    cache.get(first)
+    assert gateway.calls == 5
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_async_callers_share_one_request():
+    gateway = Gateway()
+
+    async def run():
+        cache = AsyncTransactionStateCache(gateway.send_async)
+        responses = await asyncio.gather(*(cache.get(request()) for _ in range(5)))
+        assert (cache.misses, cache.coalesced) == (1, 4)
+        return responses
+    responses = asyncio.run(run())
+    assert gateway.calls == 1
+    assert all(response is responses[0] for response in responses)
+
+
+def test_async_ttl(clock):
+    gateway = Gateway('')
+
+    async def run():
+        cache = AsyncTransactionStateCache(gateway.send_async, pending_ttl=2)
+        await cache.get(request())
+        clock[0] += 1
+        await cache.get(request())
+        assert gateway.calls == 1
+        clock[0] += 2
+        await cache.get(request())
+        assert gateway.calls == 2
+    asyncio.run(run())
+
+
+def test_async_cancelled_caller_does_not_cancel_others():
+    gateway = Gateway()
+
+    async def run():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def send(request):
+            started.set()
+            await release.wait()
+            return await gateway.send_async(request)
+
+        cache = AsyncTransactionStateCache(send)
+        cancelled = asyncio.ensure_future(cache.get(request()))
+        waiting = asyncio.ensure_future(cache.get(request()))
+        await started.wait()
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert (await waiting).tran_code == '000'
+        assert cancelled.cancelled()
+    asyncio.run(run())
+    assert gateway.calls == 1
+
+
+@pytest.mark.parametrize('fail', [False, True])
+def test_async_all_callers_cancelled(fail):
+    errors = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        started, release, finished = asyncio.Event(), asyncio.Event(), asyncio.Event()
+
+        async def send(request):
+            started.set()
+            await release.wait()
+            finished.set()
+            if fail:
+                raise GatewayError('Gateway answered with HTTP 503')
+            return state(request, '000')
+
+        cache = AsyncTransactionStateCache(send)
+        callers = [asyncio.ensure_future(cache.get(request())) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        release.set()
+        await finished.wait()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        # the request still ran to the end; its response is kept for the next caller
+        assert len(cache) == (0 if fail else 1)
+        del callers
+        gc.collect()
+    asyncio.run(run())
+    gc.collect()
+    assert errors == []
@@ -0,0 +1,91 @@
+import pytest
+
+from upcpayment import Upc_payment_xml
+from upcpayment.samples import sample_request
+from upcpayment.signer import EnvelopedSigner
+from upcpayment.timing import StageTimer, add_hook, remove_hook, stage_timings
+from upcpayment.Upc_payment import Upc_payment
+
+RESPONSE = ('<ECommerceConnect><Message id="1234" version="1.0"><XMLPayResponse><ResponseData>'
+            '<MerchantID>1756190</MerchantID><TerminalID>E7884956</TerminalID><OrderID>1234</OrderID>'
+            '<TranCode>000</TranCode><ApprovalCode>A1B2C3</ApprovalCode><Rrn>123456789012</Rrn>'
+            '<Comment>Approved</Comment><HostCode>00</HostCode><CVResult>M</CVResult>'
+            '</ResponseData></XMLPayResponse></Message></ECommerceConnect>')
+
+
+class Recorder(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, message_type, stage, seconds):
+        assert seconds >= 0
+        self.calls.append((message_type, stage))
+
+    def stages(self):
+        return [stage for _, stage in self.calls]
+
+
+def test_signing_stages(key_files):
+    request = sample_request(Upc_payment_xml.AuthorizationRequest)
+    with stage_timings(Recorder()) as recorder:
+        request.generate_xml_with_signature(key_files[0], validate=True)
+    assert recorder.calls == [('AuthorizationRequest', stage)
+                              for stage in ('validate', 'key_read', 'c14n', 'digest', 'rsa', 'tostring')]
+
+
+def test_response_parsing_stages(key_files):
+    document = EnvelopedSigner(key_files[0]).sign_canonical(RESPONSE.encode('ascii'))
+    with stage_timings(Recorder()) as recorder:
+        Upc_payment_xml.AuthorizationResponse_check_sign_and_parse(document, key_files[1])
+    assert {message_type for message_type, _ in recorder.calls} == {'AuthorizationResponse'}
+    stages = recorder.stages()
+    assert stages[:2] == ['key_read', 'tree_build'] and stages[-1] == 'fields'
+    assert {'c14n', 'digest', 'rsa'} <= set(stages)
+
+
+def test_payment_page_stages(key_files):
+    payment = Upc_payment('1756190', 'E7884956', 10000, '980', 'ua', 1234, 'Order description')
+    with stage_timings(Recorder()) as recorder:
+        payment.generate_signature(key_files[0])
+    assert recorder.calls == [('Upc_payment', 'key_read'), ('Upc_payment', 'rsa')]
+
+
+def test_removed_hook_gets_nothing(key_files):
+    request = sample_request(Upc_payment_xml.AuthorizationRequest)
+    recorder, other = Recorder(), Recorder()
+    add_hook(recorder)
+    add_hook(other)
+    try:
+        request.generate_xml_with_signature(key_files[0])
+        delivered = len(recorder.calls)
+        remove_hook(recorder)
+        request.generate_xml_with_signature(key_files[0])
+    finally:
+        remove_hook(other)
+    assert delivered and len(recorder.calls) == delivered
+    assert len(other.calls) == 2 * delivered
+
+    request.generate_xml_with_signature(key_files[0])
+    assert len(other.calls) == 2 * delivered
+
+
+def test_stage_timings_removes_hook_on_error():
+    recorder = Recorder()
+    with pytest.raises(RuntimeError):
+        with stage_timings(recorder):
+            StageTimer('Test').lap('one')
+            raise RuntimeError
+    StageTimer('Test').lap('two')
+    assert recorder.calls == [('Test', 'one')]
+
+
+def test_hook_removed_during_lap_does_not_skip_others():
+    recorder = Recorder()
+
+    def remove_itself(message_type, stage, seconds):
+        remove_hook(remove_itself)
+
+    add_hook(remove_itself)
+    with stage_timings(recorder):
+        StageTimer('Test').lap('one')
+    assert recorder.calls == [('Test', 'one')]
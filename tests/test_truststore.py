@@ -0,0 +1,45 @@
+import os
+
+import pytest
+from cryptography import x509
+from OpenSSL import crypto
+
+from upcpayment.samples import generate_key_file
+from upcpayment.truststore import TrustStore, get_trust_store
+
+
+@pytest.fixture(scope='module')
+def certificate_pem(key_files):
+    with open(key_files[1], 'rb') as cert_file:
+        return cert_file.read()
+
+
+def test_store_is_passed_through(key_files):
+    store = TrustStore(key_files[1])
+    assert get_trust_store(store) is store
+
+
+def test_path_store_is_cached_and_reloaded(tmp_path):
+    _, cert_path = generate_key_file(tmp_path, 'gateway')
+    store = get_trust_store(cert_path)
+    assert get_trust_store(cert_path) is store
+
+    _, new_cert_path = generate_key_file(tmp_path, 'rotated')
+    os.replace(new_cert_path, cert_path)
+    assert get_trust_store(cert_path) is not store
+
+
+def test_pem_bytes_store_is_cached(certificate_pem):
+    store = get_trust_store(certificate_pem)
+    assert get_trust_store(bytes(bytearray(certificate_pem))) is store
+    assert len(store) == 1
+
+
+def test_certificate_object_store_is_cached(certificate_pem):
+    certificate = x509.load_pem_x509_certificate(certificate_pem)
+    store = get_trust_store(certificate)
+    assert get_trust_store(x509.load_pem_x509_certificate(certificate_pem)) is store
+    assert store.certificates == (certificate,)
+
+    openssl_certificate = crypto.load_certificate(crypto.FILETYPE_PEM, certificate_pem)
+    assert get_trust_store(openssl_certificate) is get_trust_store(openssl_certificate)
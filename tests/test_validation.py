@@ -0,0 +1,67 @@
+import pytest
+from lxml import etree
+
+from upcpayment import Upc_payment_xml, validation
+from upcpayment.exceptions import InvalidInput
+from upcpayment.samples import sample_request
+from upcpayment.serializer import serialize
+
+REQUEST_CLASSES = list(Upc_payment_xml._RESPONSE_CLASSES)
+
+
+@pytest.mark.parametrize('request_class', REQUEST_CLASSES, ids=lambda request_class: request_class.__name__)
+def test_valid_request(key_files, request_class):
+    request = sample_request(request_class)
+    validation.validate(request)
+    # the document of the lxml builder, which the serializer does not share code with
+    validation._check(etree.tostring(request.generate_xml()), request_class.__name__)
+    # the signature is allowed after the message
+    validation._check(request.generate_xml_with_signature(key_files[0], validate=True), request_class.__name__)
+
+
+def test_valid_batch():
+    requests = [sample_request(Upc_payment_xml.RefundRequest, order_id='1'),
+                sample_request(Upc_payment_xml.PostAuthorizationRequest, order_id='2')]
+    validation.validate_batch(requests, 'batch')
+
+
+@pytest.mark.parametrize('tag', ['MerchantID', 'TerminalID', 'OrderID', 'TotalAmount', 'Currency', 'CardNum'])
+def test_missing_required_element(tag):
+    document = serialize(sample_request(Upc_payment_xml.AuthorizationRequest))
+    start, end = document.index('<{}>'.format(tag).encode()), document.index('</{}>'.format(tag).encode())
+    document = document[:start] + document[end + len(tag) + 3:]
+    with pytest.raises(InvalidInput, match=tag):
+        validation._check(document, 'AuthorizationRequest')
+
+
+@pytest.mark.parametrize('values', [
+    {'total_amount': '10.00'},
+    {'total_amount': ''},
+    {'currency': 'UAH'},
+    {'exp_month': '1'},
+    {'merchant_id': ''},
+    {'order_id': ''},
+], ids=lambda values: ','.join(values))
+def test_bad_field_format(values):
+    with pytest.raises(InvalidInput, match='does not match the xmlpay schema'):
+        validation.validate(sample_request(Upc_payment_xml.AuthorizationRequest, **values))
+
+
+@pytest.mark.parametrize('after', ['</TerminalID>', '<Transaction id="1234567890">', '<Invoice>'])
+def test_unknown_element(after):
+    document = serialize(sample_request(Upc_payment_xml.AuthorizationRequest))
+    position = document.index(after.encode()) + len(after)
+    document = document[:position] + b'<Unknown>x</Unknown>' + document[position:]
+    with pytest.raises(InvalidInput, match='Unknown'):
+        validation._check(document, 'AuthorizationRequest')
+
+
+def test_signing_validates_on_request(key_files, monkeypatch):
+    request = sample_request(Upc_payment_xml.RefundRequest, currency='UAH')
+    request.generate_xml_with_signature(key_files[0])
+    with pytest.raises(InvalidInput):
+        request.generate_xml_with_signature(key_files[0], validate=True)
+    monkeypatch.setattr(validation, 'validate_requests', True)
+    with pytest.raises(InvalidInput):
+        request.generate_xml_with_signature(key_files[0])
+    request.generate_xml_with_signature(key_files[0], validate=False)
@@ -0,0 +1,52 @@
+import pytest
+from lxml import etree
+
+from upcpayment import Upc_payment_xml
+from upcpayment.exceptions import InvalidInput, InvalidSignature
+from upcpayment.signer import EnvelopedSigner
+from upcpayment.truststore import TrustStore
+from upcpayment.verifier import verify_enveloped
+
+RESPONSE = ('<ECommerceConnect><Message id="1234" version="1.0"><XMLPayResponse><ResponseData>'
+            '<MerchantID>1756190</MerchantID><TerminalID>E7884956</TerminalID><OrderID>1234</OrderID>'
+            '<TranCode>000</TranCode><ApprovalCode>A1B2C3</ApprovalCode><Rrn>123456789012</Rrn>'
+            '<Comment>Approved</Comment><HostCode>00</HostCode><CVResult>M</CVResult>'
+            '</ResponseData></XMLPayResponse></Message></ECommerceConnect>')
+
+
+@pytest.fixture
+def signxml_signed(signxml_sign, key_files):
+    return signxml_sign(etree.fromstring(RESPONSE), key_files[0])
+
+
+@pytest.fixture(scope='module')
+def trust_store(key_files):
+    return TrustStore(key_files[1])
+
+
+@pytest.mark.parametrize('sign', ['signxml', 'signer'])
+def test_verifies_signed_response(key_files, trust_store, signxml_signed, sign):
+    document = (signxml_signed if sign == 'signxml'
+                else EnvelopedSigner(key_files[0]).sign_canonical(RESPONSE.encode('ascii')))
+    signed_xml = verify_enveloped(etree.fromstring(document), trust_store)
+    assert signed_xml.findtext('.//TranCode') == '000'
+
+
+def test_comment_is_not_signed(key_files, trust_store, signxml_signed):
+    document = signxml_signed.replace(b'<TranCode>', b'<!--c--><TranCode>')
+    signed_xml = verify_enveloped(etree.fromstring(document), trust_store)
+    assert signed_xml.findtext('.//TranCode') == '000'
+    response = Upc_payment_xml.AuthorizationResponse_check_sign_and_parse(document, key_files[1])
+    assert response.approval_code == 'A1B2C3'
+
+
+def test_changed_response_is_rejected(trust_store, signxml_signed):
+    document = signxml_signed.replace(b'<TranCode>000', b'<TranCode>001')
+    with pytest.raises(InvalidSignature):
+        verify_enveloped(etree.fromstring(document), trust_store)
+
+
+def test_malformed_response_is_not_recovered(key_files, signxml_signed):
+    document = signxml_signed.replace(b'</Comment>', b'</Comment><Broken>')
+    with pytest.raises(InvalidInput):
+        Upc_payment_xml.AuthorizationResponse_check_sign_and_parse(document, key_files[1])
@@ -0,0 +1,199 @@
+import asyncio
+import ssl
+from urllib.parse import urlsplit
+
+from .exceptions import GatewayError
+from .session import _IDEMPOTENT_REQUESTS
+from .signer import get_signer
+from .truststore import get_trust_store
+from .Upc_payment_xml import parse_response
+
+
+class _StaleConnection(Exception):
+    def __init__(self, sent):
+        super().__init__()
+        # False only if no byte of the request was handed to the connection
+        self.sent = sent
+
+
+class _Connection(object):
+    __slots__ = ('reader', 'writer', 'reused')
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+
+
+class _HostPool(object):
+    def __init__(self, host, port, ssl_context, size):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def acquire(self):
+        await self._slots.acquire()
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection.writer.is_closing() and not connection.reader.at_eof():
+                return connection
+            connection.writer.close()
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+        except BaseException:
+            self._slots.release()
+            raise
+        return _Connection(reader, writer)
+
+    def release(self, connection, keep_alive):
+        if keep_alive:
+            connection.reused = True
+            self._idle.append(connection)
+        else:
+            connection.writer.close()
+        self._slots.release()
+
+    def close(self):
+        for connection in self._idle:
+            connection.writer.close()
+        self._idle.clear()
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size = int((await reader.readline()).split(b';', 1)[0], 16)
+        if size == 0:
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return b''.join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readline()
+
+async def _exchange(connection, data):
+    if connection.writer.is_closing() or connection.reader.at_eof():
+        raise _StaleConnection(False)
+    try:
+        connection.writer.write(data)
+        await connection.writer.drain()
+        status_line = await connection.reader.readline()
+    except (ConnectionError, OSError):
+        raise _StaleConnection(True)
+    if not status_line:
+        raise _StaleConnection(True)
+
+    version, status = status_line.split(None, 2)[:2]
+    headers = {}
+    while True:
+        line = await connection.reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = version == b'HTTP/1.1' and headers.get(b'connection', b'').lower() != b'close'
+    if b'chunked' in headers.get(b'transfer-encoding', b'').lower():
+        body = await _read_chunked(connection.reader)
+    elif b'content-length' in headers:
+        body = await connection.reader.readexactly(int(headers[b'content-length']))
+    else:
+        body = await connection.reader.read()
+        keep_alive = False
+    return int(status), body, keep_alive
+
+
+class AsyncGatewayClient(object):
+    """
+    Sends Upc_payment_xml requests to the gateway and returns parsed responses.
+    Signing and response checks run in an executor, off the event loop;
+    requests go over keep-alive connections, at most `pool_size` per host
+    (`pool_sizes` overrides it for single hosts) and at most
+    `max_concurrency` requests at a time. A request the gateway may have
+    received is sent again on a new connection only if it is idempotent
+    (TransactionStateRequest).
+    """
+    def __init__(self, url, private_key, certificate, max_concurrency=100, pool_size=10, pool_sizes=None,
+                 timeout=30.0, ssl_context=None, executor=None, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.pool_sizes = pool_sizes or {}
+        self.ssl_context = ssl_context
+        self.headers = {'Content-Type': 'text/xml; charset=utf-8'}
+        self.headers.update(headers or {})
+        self._signer = get_signer(private_key)
+        self._trust_store = get_trust_store(certificate)
+        self._executor = executor
+        self._pools = {}
+        self._concurrency = None
+
+    def _pool(self, scheme, host, port):
+        pool = self._pools.get((scheme, host, port))
+        if pool is None:
+            ssl_context = None
+            if scheme == 'https':
+                ssl_context = self.ssl_context or ssl.create_default_context()
+            pool = _HostPool(host, port, ssl_context, self.pool_sizes.get(host, self.pool_size))
+            self._pools[(scheme, host, port)] = pool
+        return pool
+
+    def _request_head(self, parts, content_length):
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        lines = ['POST {} HTTP/1.1'.format(target),
+                 'Host: {}'.format(parts.netloc),
+                 'Content-Length: {}'.format(content_length),
+                 'Connection: keep-alive']
+        lines += ['{}: {}'.format(name, value) for name, value in self.headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def post(self, body, url=None, idempotent=False):
+        parts = urlsplit(url or self.url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        pool = self._pool(parts.scheme, parts.hostname, port)
+        data = self._request_head(parts, len(body)) + body
+
+        for attempt in (0, 1):
+            connection = await pool.acquire()
+            try:
+                status, response, keep_alive = await _exchange(connection, data)
+            except _StaleConnection as exc:
+                pool.release(connection, False)
+                # a reused keep-alive connection may have been closed by the gateway meanwhile;
+                # if the request went out, the gateway may have processed it
+                if connection.reused and attempt == 0 and (idempotent or not exc.sent):
+                    continue
+                raise GatewayError('Connection closed by gateway')
+            except BaseException:
+                pool.release(connection, False)
+                raise
+            pool.release(connection, keep_alive)
+            if status != 200:
+                raise GatewayError('Gateway answered with HTTP {}'.format(status))
+            return response
+
+    async def send(self, request, url=None, idempotent=None):
+        if idempotent is None:
+            idempotent = isinstance(request, _IDEMPOTENT_REQUESTS)
+        loop = asyncio.get_running_loop()
+        if self._concurrency is None:
+            self._concurrency = asyncio.Semaphore(self.max_concurrency)
+        async with self._concurrency:
+            body = await loop.run_in_executor(self._executor, request.generate_xml_with_signature, self._signer)
+            response = await asyncio.wait_for(self.post(body, url, idempotent), self.timeout)
+        return await loop.run_in_executor(self._executor, parse_response, request, response, self._trust_store)
+
+    async def close(self):
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,105 @@
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+
+from .keyring import Keyring, load_private_key
+from .lazy import lazy_import
+from .Upc_payment import Upc_payment
+
+serialization = lazy_import('cryptography.hazmat.primitives.serialization')
+
+_worker_key = None
+
+
+def _merchant_terminal(item):
+    if isinstance(item, Upc_payment):
+        return item.merchantId, item.terminalid
+    return item.merchant_id, item.terminal_id
+
+def _sign(item, key):
+    if isinstance(key, Keyring):
+        key = key.entry(*_merchant_terminal(item))
+    if isinstance(item, Upc_payment):
+        item.generate_signature(key)
+        return item.signature
+    return item.generate_xml_with_signature(key)
+
+def _sign_chunk_with_key(key, chunk):
+    return [_sign(item, key) for item in chunk]
+
+def _init_worker(shipped_key):
+    global _worker_key
+    if isinstance(shipped_key, bytes):
+        _worker_key = serialization.load_pem_private_key(shipped_key, password=None)
+    else:
+        _worker_key = Keyring(maxsize=len(shipped_key) or 1)
+        for (merchant_id, terminal_id), path in shipped_key.items():
+            _worker_key.add(merchant_id, terminal_id, path)
+
+def _ship_key(private_key):
+    # the key as loaded here and in the form sent to worker processes (see _init_worker)
+    if isinstance(private_key, Keyring):
+        return private_key, {(entry.merchant_id, entry.terminal_id): entry.path for entry in private_key.entries()}
+    key = load_private_key(private_key)
+    return key, key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption())
+
+def _sign_chunk(chunk):
+    return _sign_chunk_with_key(_worker_key, chunk)
+
+def sign_many(items, private_key, workers=None, mode='process', ordered=True, chunksize=32):
+    """
+    Signs Upc_payment objects and Upc_payment_xml requests on several cores.
+    Yields (item, result) pairs, where result is the PaymentPage signature or
+    the signed xml, in input order or (ordered=False) as soon as they are ready.
+
+    private_key is anything generate_signature accepts, or a Keyring to pick
+    the key of every item by its merchant/terminal pair. The key (or the
+    keyring's file paths) is sent to each worker process once.
+    """
+    if mode not in ('process', 'thread'):
+        raise ValueError('mode must be "process" or "thread"')
+    workers = workers or os.cpu_count() or 1
+
+    key, shipped_key = _ship_key(private_key)
+
+    if mode == 'process':
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shipped_key,))
+        submit = lambda chunk: executor.submit(_sign_chunk, chunk)
+    else:
+        executor = ThreadPoolExecutor(workers)
+        submit = lambda chunk: executor.submit(_sign_chunk_with_key, key, chunk)
+
+    items = iter(items)
+    max_pending = workers * 2
+    pending = deque() if ordered else {}
+    try:
+        while True:
+            while len(pending) < max_pending:
+                chunk = list(islice(items, chunksize))
+                if not chunk:
+                    break
+                future = submit(chunk)
+                if ordered:
+                    pending.append((future, chunk))
+                else:
+                    pending[future] = chunk
+            if not pending:
+                return
+
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                done = [(future, pending.pop(future)) for future in finished]
+
+            for future, chunk in done:
+                for item, result in zip(chunk, future.result()):
+                    if isinstance(item, Upc_payment):
+                        item.signature = result
+                    yield item, result
+    finally:
+        for future in ([future for future, _ in pending] if ordered else pending):
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,229 @@
+import json
+import struct
+import sys
+from array import array
+from dataclasses import fields
+from itertools import accumulate
+from operator import attrgetter
+
+from .lazy import lazy_import
+
+numpy = lazy_import('numpy')
+
+_MAGIC = b'UPCCOL1\n'
+_HEADER_SIZE = struct.Struct('<I')
+# array typecodes of dictionary codes, smallest first
+_CODE_TYPES = ('B', 'H', 'I', 'Q')
+
+
+def _code_type(size):
+    for typecode in _CODE_TYPES:
+        if size <= 1 << (8 * array(typecode).itemsize):
+            return typecode
+    raise ValueError('Too many distinct values')
+
+def _offsets(encoded):
+    offsets = array('Q', [0])
+    offsets.extend(accumulate(map(len, encoded)))
+    return offsets
+
+
+class StringColumn(object):
+    """
+    Strings stored as one utf-8 buffer and an array of offsets into it
+    (like Arrow's string arrays): two objects instead of one per value.
+    """
+    __slots__ = ('offsets', 'data')
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    @classmethod
+    def encode(cls, values):
+        encoded = [value.encode('utf-8') for value in values]
+        return cls(_offsets(encoded), b''.join(encoded))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode('utf-8')
+
+    def __iter__(self):
+        data, offsets = self.data, self.offsets
+        for start, end in zip(offsets, offsets[1:]):
+            yield data[start:end].decode('utf-8')
+
+    def to_numpy(self):
+        return numpy.array(list(self), dtype=str)
+
+
+class DictionaryColumn(object):
+    """
+    Strings stored as the list of distinct `values` and an array of `codes`
+    into it, one per row, in the smallest integer type that fits.
+    """
+    __slots__ = ('values', 'codes')
+
+    def __init__(self, values, codes):
+        self.values = values
+        self.codes = codes
+
+    @classmethod
+    def encode(cls, values):
+        dictionary = {}
+        codes = [dictionary.setdefault(value, len(dictionary)) for value in values]
+        return cls(list(dictionary), array(_code_type(len(dictionary)), codes))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.values[self.codes[index]]
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes)
+
+    def counts(self):
+        """
+        Number of rows per value, in the order of `values`.
+        """
+        counts = [0] * len(self.values)
+        for code in self.codes:
+            counts[code] += 1
+        return counts
+
+    def numpy_codes(self):
+        """
+        The codes as a NumPy array, without a copy (e.g. for numpy.bincount).
+        """
+        return numpy.frombuffer(self.codes, dtype=self.codes.typecode)
+
+    def to_numpy(self):
+        return numpy.array(self.values, dtype=str)[self.numpy_codes()]
+
+
+class Columns(object):
+    """
+    Responses of one dataclass stored column by column: a DictionaryColumn
+    for fields with few distinct values (tran_code, terminal_id, ...) and a
+    StringColumn for the others (rrn, order_id, ...).
+    """
+    def __init__(self, response_class, columns, length):
+        self.response_class = response_class
+        self.columns = columns
+        self.length = length
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return self.length
+
+    def rows(self):
+        """
+        Tuples of values in column order.
+        """
+        return zip(*self.columns.values())
+
+    def to_responses(self):
+        return self.response_class.from_records(self.rows())
+
+    def to_numpy(self):
+        """
+        {field: NumPy array of str}.
+        """
+        return {name: column.to_numpy() for name, column in self.columns.items()}
+
+
+def to_columns(responses, response_class=None, dictionary_ratio=0.5):
+    """
+    Converts a sequence of response dataclasses (e.g. AuthorizationResponse,
+    all of the same class) to Columns. A field is dictionary encoded if it
+    has at most `dictionary_ratio` distinct values per row.
+    """
+    responses = responses if isinstance(responses, (list, tuple)) else list(responses)
+    if response_class is None:
+        if not responses:
+            raise ValueError('Give response_class for an empty sequence')
+        response_class = type(responses[0])
+    columns = {}
+    for field in fields(response_class):
+        values = list(map(attrgetter(field.name), responses))
+        column = DictionaryColumn.encode(values)
+        if len(column.values) > dictionary_ratio * len(values):
+            column = StringColumn.encode(values)
+        columns[field.name] = column
+    return Columns(response_class, columns, len(responses))
+
+
+def _write_strings(file, values):
+    encoded = [value.encode('utf-8') for value in values]
+    file.write(_offsets(encoded).tobytes())
+    file.write(b''.join(encoded))
+
+def _read_array(file, typecode, length, swap):
+    values = array(typecode)
+    values.frombytes(file.read(length * values.itemsize))
+    if swap:
+        values.byteswap()
+    return values
+
+def _read_strings(file, length, swap):
+    offsets = _read_array(file, 'Q', length + 1, swap)
+    return offsets, file.read(offsets[-1])
+
+
+def write_columns(columns, file):
+    """
+    Writes Columns to a binary file: a JSON header, then the buffers of every column.
+    """
+    header = {'response_class': columns.response_class.__name__, 'length': columns.length,
+              'byteorder': sys.byteorder, 'columns': []}
+    for name, column in columns.columns.items():
+        if isinstance(column, DictionaryColumn):
+            header['columns'].append({'name': name, 'encoding': 'dictionary', 'size': len(column.values),
+                                      'itemsize': column.codes.itemsize})
+        else:
+            header['columns'].append({'name': name, 'encoding': 'plain'})
+    header = json.dumps(header).encode('utf-8')
+    file.write(_MAGIC + _HEADER_SIZE.pack(len(header)) + header)
+    for column in columns.columns.values():
+        if isinstance(column, DictionaryColumn):
+            _write_strings(file, column.values)
+            file.write(column.codes.tobytes())
+        else:
+            file.write(column.offsets.tobytes())
+            file.write(column.data)
+
+def read_columns(file, response_class=None):
+    """
+    Reads Columns written by write_columns. The response class is looked up
+    in Upc_payment_xml by name, unless given.
+    """
+    if file.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError('Not a upcpayment columns file')
+    header = json.loads(file.read(_HEADER_SIZE.unpack(file.read(_HEADER_SIZE.size))[0]).decode('utf-8'))
+    if response_class is None:
+        from . import Upc_payment_xml
+        response_class = getattr(Upc_payment_xml, header['response_class'])
+    swap = header['byteorder'] != sys.byteorder
+    length = header['length']
+    columns = {}
+    for description in header['columns']:
+        if description['encoding'] == 'dictionary':
+            offsets, data = _read_strings(file, description['size'], swap)
+            values = list(StringColumn(offsets, data))
+            typecode = next(typecode for typecode in _CODE_TYPES
+                            if array(typecode).itemsize == description['itemsize'])
+            columns[description['name']] = DictionaryColumn(values, _read_array(file, typecode, length, swap))
+        else:
+            columns[description['name']] = StringColumn(*_read_strings(file, length, swap))
+    return Columns(response_class, columns, length)
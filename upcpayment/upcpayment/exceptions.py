@@ -2,4 +2,21 @@ class InvalidInput(ValueError):
     pass
 
 class AltCurrencyAmountNullException(ValueError):
-    pass
\ No newline at end of file
+    pass
+
+class InvalidSignature(ValueError):
+    pass
+
+class GatewayError(IOError):
+    pass
+
+class PollingIncomplete(GatewayError):
+    """
+    Raised by the poller after the final states it could get: `pending` are
+    the requests still pending at the timeout, `failed` the (request,
+    exception) pairs whose response failed to parse or verify.
+    """
+    def __init__(self, pending, failed):
+        super().__init__('{} order(s) pending, {} failed'.format(len(pending), len(failed)))
+        self.pending = pending
+        self.failed = failed
@@ -0,0 +1,284 @@
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+from .records import Record, slotted
+
+# crc32 of the rest, seq, time, kind, sizes of order_id, merchant_id, terminal_id, message_type and document
+_HEADER = struct.Struct('>IQdBHHHHI')
+_ENTRY, _ACK = 0, 1
+_SEGMENT = 'journal-{:020d}.log'
+_SEGMENT_NAME = re.compile(r'^journal-(\d{20})\.log$')
+
+_fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+
+def _encode(seq, kind, order_id='', merchant_id='', terminal_id='', message_type='', document=b''):
+    fields = [value.encode('utf-8') for value in (order_id, merchant_id, terminal_id, message_type)]
+    body = _HEADER.pack(0, seq, time.time(), kind, *(len(value) for value in fields), len(document))[4:]
+    body = b''.join([body] + fields + [document])
+    return struct.pack('>I', zlib.crc32(body)) + body
+
+def _sync_directory(directory):
+    # makes a new segment file itself durable, not only its content
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@slotted
+@dataclass(frozen=True, order=True)
+class JournalEntry(Record):
+    seq: int
+    timestamp: float
+    order_id: str
+    merchant_id: str
+    terminal_id: str
+    message_type: str
+    document: bytes
+
+
+class JournalReader(object):
+    """
+    Memory-mapped view of the journal in `directory`, indexed by seq and
+    order_id, for replaying entries that were not acknowledged before a
+    restart. A torn entry at the end of a segment (crash during a write)
+    and everything after it in that segment is ignored.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = []
+        self.last_seq = 0
+        # seq for the next entry: after every entry, acknowledgement and segment start seen, so
+        # that seqs are not reused once pruned segments are gone and old acks would hide new entries
+        self.next_seq = 1
+        self._maps = []
+        self._index = {}
+        self._orders = {}
+        self._acknowledged = set()
+        for name in sorted(os.listdir(directory)):
+            match = _SEGMENT_NAME.match(name)
+            if match:
+                self.next_seq = max(self.next_seq, int(match.group(1)))
+                self._scan(os.path.join(directory, name))
+
+    def _scan(self, path):
+        seqs = []
+        with open(path, 'rb') as segment:
+            size = os.fstat(segment.fileno()).st_size
+            data = mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if size:
+            self._maps.append(data)
+        offset = 0
+        while offset + _HEADER.size <= size:
+            crc, seq, _, kind, *sizes = _HEADER.unpack_from(data, offset)
+            end = offset + _HEADER.size + sum(sizes)
+            if end > size or zlib.crc32(data[offset + 4:end]) != crc:
+                break
+            self.next_seq = max(self.next_seq, seq + 1)
+            if kind == _ACK:
+                self._acknowledged.add(seq)
+            else:
+                self._index[seq] = (data, offset)
+                order_size = sizes[0]
+                order_id = data[offset + _HEADER.size:offset + _HEADER.size + order_size].decode('utf-8')
+                self._orders.setdefault(order_id, []).append(seq)
+                self.last_seq = max(self.last_seq, seq)
+                seqs.append(seq)
+            offset = end
+        # (path, seqs of its entries, size of the valid part)
+        self.segments.append((path, seqs, offset))
+
+    def _decode(self, seq):
+        data, offset = self._index[seq]
+        _, seq, timestamp, _, *sizes = _HEADER.unpack_from(data, offset)
+        values = []
+        position = offset + _HEADER.size
+        for size in sizes:
+            values.append(data[position:position + size])
+            position += size
+        order_id, merchant_id, terminal_id, message_type = (value.decode('utf-8') for value in values[:4])
+        return JournalEntry(seq, timestamp, order_id, merchant_id, terminal_id, message_type, values[4])
+
+    def entry(self, seq):
+        return self._decode(seq)
+
+    def entries(self):
+        for seq in sorted(self._index):
+            yield self._decode(seq)
+
+    def unacknowledged(self):
+        """
+        Entries without an acknowledgement, in the order they were appended.
+        """
+        for seq in sorted(self._index):
+            if seq not in self._acknowledged:
+                yield self._decode(seq)
+
+    def find(self, order_id):
+        return [self._decode(seq) for seq in self._orders.get(order_id, ())]
+
+    def is_acknowledged(self, seq):
+        return seq in self._acknowledged
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, seq):
+        return seq in self._index
+
+    def close(self):
+        for data in self._maps:
+            data.close()
+        self._maps = []
+        self._index.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Journal(object):
+    """
+    Append-only journal of signed documents in segment files of about
+    `segment_size` bytes in `directory`. append() returns when the entry is
+    on disk; writers that append at the same time share one fdatasync
+    (group commit). With `commit_delay` the syncing writer waits that many
+    seconds for others to join first. Thread-safe.
+    """
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, commit_delay=0.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.commit_delay = commit_delay
+        self.syncs = 0
+        self._cond = threading.Condition()
+        self._writes = 0
+        self._synced = 0
+        self._syncing = False
+        self._retired = []
+
+        with JournalReader(directory) as reader:
+            self._next_seq = reader.next_seq
+            last = reader.segments[-1] if reader.segments else None
+        if last is not None:
+            path, _, valid_size = last
+            # drop a torn entry left by a crash, the segment goes on after the last good one
+            os.truncate(path, valid_size)
+            self._open_segment(path)
+        else:
+            self._open_segment(os.path.join(directory, _SEGMENT.format(self._next_seq)))
+
+    def _open_segment(self, path):
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._path = path
+        self._size = os.fstat(self._fd).st_size
+        _sync_directory(self.directory)
+
+    def _write(self, record):
+        # called with self._cond held
+        if self._size and self._size + len(record) > self.segment_size:
+            _fdatasync(self._fd)
+            self._synced = self._writes
+            if self._syncing:
+                # the syncing writer still uses the fd, it closes it when done
+                self._retired.append(self._fd)
+            else:
+                os.close(self._fd)
+            self._open_segment(os.path.join(self.directory, _SEGMENT.format(self._next_seq)))
+        os.write(self._fd, record)
+        self._size += len(record)
+        self._writes += 1
+        return self._writes
+
+    def _sync(self, ticket):
+        with self._cond:
+            while self._synced < ticket:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._syncing = True
+                try:
+                    if self.commit_delay:
+                        self._cond.wait(self.commit_delay)
+                    target, fd = self._writes, self._fd
+                    self._cond.release()
+                    try:
+                        _fdatasync(fd)
+                    finally:
+                        self._cond.acquire()
+                    self._synced = max(self._synced, target)
+                    self.syncs += 1
+                finally:
+                    self._syncing = False
+                    while self._retired:
+                        os.close(self._retired.pop())
+                    self._cond.notify_all()
+
+    def append(self, document, order_id='', merchant_id='', terminal_id='', message_type='', sync=True):
+        """
+        Writes the signed document with its metadata and returns the seq of
+        the entry; with sync=True only after it is on disk.
+        """
+        with self._cond:
+            seq = self._next_seq
+            ticket = self._write(_encode(seq, _ENTRY, order_id, merchant_id, terminal_id, message_type, document))
+            self._next_seq += 1
+        if sync:
+            self._sync(ticket)
+        return seq
+
+    def append_request(self, request, document, sync=True):
+        """
+        append() for a signed Upc_payment_xml request, with its order_id, merchant/terminal and type.
+        """
+        return self.append(document, request.order_id, request.merchant_id, request.terminal_id,
+                           type(request).__name__, sync)
+
+    def acknowledge(self, seq, sync=False):
+        """
+        Marks the entry as done (e.g. the response was received), so replay skips it.
+        A lost acknowledgement only makes replay check the entry again.
+        """
+        with self._cond:
+            ticket = self._write(_encode(seq, _ACK))
+        if sync:
+            self._sync(ticket)
+
+    def prune(self):
+        """
+        Removes the oldest segments whose entries are all acknowledged. Returns their paths.
+        """
+        removed = []
+        with JournalReader(self.directory) as reader:
+            for path, seqs, _ in reader.segments:
+                if path == self._path or not all(reader.is_acknowledged(seq) for seq in seqs):
+                    break
+                os.remove(path)
+                removed.append(path)
+        return removed
+
+    def close(self):
+        with self._cond:
+            if self._fd is None:
+                return
+            ticket = self._writes
+        self._sync(ticket)
+        with self._cond:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
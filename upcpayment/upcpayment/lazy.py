@@ -0,0 +1,24 @@
+import importlib
+
+
+class LazyModule(object):
+    """
+    Stands for a module that is imported on the first attribute access,
+    so importing upcpayment does not load lxml, signxml, OpenSSL or
+    cryptography until they are needed. After the import the module's
+    attributes are copied to the instance and looked up as fast as on the module.
+    """
+    def __init__(self, name):
+        self._lazy_name = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._lazy_name)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return '<lazy module {!r}>'.format(self._lazy_name)
+
+
+def lazy_import(name):
+    return LazyModule(name)
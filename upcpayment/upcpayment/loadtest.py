@@ -0,0 +1,164 @@
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+from . import Upc_payment_xml
+from .exceptions import GatewayError, InvalidInput, InvalidSignature
+from .lazy import lazy_import
+from .samples import sample_request
+
+asyncio = lazy_import('asyncio')
+
+_REQUEST_CLASSES = {request_class.__name__: request_class for request_class in Upc_payment_xml._RESPONSE_CLASSES}
+_ERRORS = (GatewayError, InvalidInput, InvalidSignature, OSError)
+
+
+def percentile(latencies, share):
+    """
+    Nearest-rank percentile of sorted latencies.
+    """
+    if not latencies:
+        return 0.0
+    return latencies[min(len(latencies) - 1, int(share * len(latencies)))]
+
+
+def _run_async(url, key, certificate, requests, concurrency):
+    from .async_client import AsyncGatewayClient
+
+    async def run():
+        latencies, errors, tran_codes = [], Counter(), Counter()
+        queue = iter(requests)
+        async with AsyncGatewayClient(url, key, certificate, max_concurrency=concurrency,
+                                      pool_size=concurrency) as client:
+            async def worker():
+                for request in queue:
+                    start = time.perf_counter()
+                    try:
+                        response = await client.send(request)
+                    except _ERRORS + (asyncio.TimeoutError,) as exc:
+                        errors[type(exc).__name__] += 1
+                        continue
+                    latencies.append(time.perf_counter() - start)
+                    tran_codes[getattr(response, 'tran_code', '')] += 1
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, errors, tran_codes
+    return asyncio.run(run())
+
+def _run_threads(url, key, certificate, requests, concurrency):
+    from .session import GatewaySession
+
+    latencies, errors, tran_codes = [], Counter(), Counter()
+    lock = threading.Lock()
+
+    def send(request):
+        start = time.perf_counter()
+        try:
+            response = session.send(request)
+        except _ERRORS as exc:
+            with lock:
+                errors[type(exc).__name__] += 1
+            return
+        latency = time.perf_counter() - start
+        with lock:
+            latencies.append(latency)
+            tran_codes[getattr(response, 'tran_code', '')] += 1
+
+    with GatewaySession(url, key, certificate, pool_size=concurrency, retries=0) as session:
+        with ThreadPoolExecutor(concurrency) as executor:
+            for _ in executor.map(send, requests):
+                pass
+    return latencies, errors, tran_codes
+
+def _run_part(options):
+    requests = [sample_request(_REQUEST_CLASSES[options['type']], order_id=str(number))
+                for number in range(options['first'], options['first'] + options['count'])]
+    run = _run_async if options['mode'] == 'async' else _run_threads
+    return run(options['url'], options['key'], options['certificate'], requests, options['concurrency'])
+
+
+def load_test(url, private_key, certificate, request_type='AuthorizationRequest', requests=1000, concurrency=50,
+              mode='async', processes=1):
+    """
+    Sends `requests` generated requests of `request_type` to `url` from
+    `processes` processes with `concurrency` requests in flight in each,
+    using AsyncGatewayClient (mode='async') or GatewaySession ('threads').
+    Returns a report dict: throughput (responses per second), latency
+    percentiles in milliseconds, errors and TranCodes by count.
+    """
+    if request_type not in _REQUEST_CLASSES:
+        raise ValueError('Unknown request type {}'.format(request_type))
+    if mode not in ('async', 'threads'):
+        raise ValueError('mode must be "async" or "threads"')
+    parts = [{'url': url, 'key': private_key, 'certificate': certificate, 'type': request_type, 'mode': mode,
+              'concurrency': concurrency, 'first': requests * number // processes,
+              'count': requests * (number + 1) // processes - requests * number // processes}
+             for number in range(processes)]
+
+    start = time.perf_counter()
+    if processes == 1:
+        results = [_run_part(parts[0])]
+    else:
+        with Pool(processes) as pool:
+            results = pool.map(_run_part, parts)
+    elapsed = time.perf_counter() - start
+
+    latencies, errors, tran_codes = [], Counter(), Counter()
+    for part_latencies, part_errors, part_tran_codes in results:
+        latencies += part_latencies
+        errors.update(part_errors)
+        tran_codes.update(part_tran_codes)
+    latencies.sort()
+    return {
+        'request_type': request_type,
+        'mode': mode,
+        'processes': processes,
+        'concurrency': concurrency,
+        'requests': requests,
+        'responses': len(latencies),
+        'errors': dict(errors),
+        'tran_codes': dict(tran_codes),
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'latency_ms': {name: percentile(latencies, share) * 1000
+                       for name, share in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('p999', 0.999), ('max', 1))},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m upcpayment.loadtest',
+                                     description='Load test of a gateway (e.g. upcpayment.simulator).')
+    parser.add_argument('url')
+    parser.add_argument('--key', required=True, help='merchant private key (*.pem)')
+    parser.add_argument('--cert', required=True, help='gateway certificate')
+    parser.add_argument('--type', default='AuthorizationRequest', choices=sorted(_REQUEST_CLASSES))
+    parser.add_argument('-n', '--requests', type=int, default=1000)
+    parser.add_argument('-c', '--concurrency', type=int, default=50, help='requests in flight per process')
+    parser.add_argument('--mode', default='async', choices=('async', 'threads'))
+    parser.add_argument('-p', '--processes', type=int, default=1)
+    parser.add_argument('-o', '--output', help='write the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = load_test(args.url, args.key, args.cert, args.type, args.requests, args.concurrency, args.mode,
+                       args.processes)
+    latency = report['latency_ms']
+    print('{type} x {requests}, {processes} process(es) x {concurrency} in flight, {mode}'.format(
+        type=args.type, requests=args.requests, processes=args.processes, concurrency=args.concurrency,
+        mode=args.mode))
+    print('responses   {} in {:.2f} s'.format(report['responses'], report['seconds']))
+    print('throughput  {:.1f} /s'.format(report['throughput']))
+    print('latency ms  ' + '  '.join('{} {:.2f}'.format(name, value) for name, value in latency.items()))
+    print('tran_codes  ' + ', '.join('{}: {}'.format(code or '-', count)
+                                     for code, count in sorted(report['tran_codes'].items())))
+    if report['errors']:
+        print('errors      ' + ', '.join('{}: {}'.format(name, count) for name, count in report['errors'].items()))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
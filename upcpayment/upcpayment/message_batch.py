@@ -0,0 +1,94 @@
+from .exceptions import InvalidInput
+from .signer import get_signer
+from .timing import StageTimer, _hooks
+from .truststore import get_trust_store
+from . import validation
+from .verifier import verify_enveloped
+from .Upc_payment_xml import _RESPONSE_CLASSES, _convert_response_to_xml, _extract_fields, _field_tags
+
+_HEADER_TAGS = {'MerchantID': 'merchant_id', 'TerminalID': 'terminal_id'}
+
+
+class MessageBatch(object):
+    """
+    Several XMLPay requests of one merchant/terminal (e.g. RefundRequest,
+    PostAuthorizationRequest) sent as one ECommerceConnect message: one
+    Transaction per request, one signature, one round trip. The Message id is
+    `message_id` or the order_id of the first request.
+    """
+    def __init__(self, requests=(), message_id=None):
+        self.requests = list(requests)
+        self.message_id = message_id
+
+    def add(self, request):
+        self.requests.append(request)
+        return self
+
+    def __len__(self):
+        return len(self.requests)
+
+    def generate_xml_with_signature(self, private_key, validate=None):
+        """
+        Signs the batch like generate_xml_with_signature of a single request does.
+        """
+        timer = StageTimer('MessageBatch') if _hooks else None
+        if validate or (validate is None and validation.validate_requests):
+            validation.validate_batch(self.requests, self.message_id)
+            if timer: timer.lap('validate')
+        signer = get_signer(private_key)
+        if timer: timer.lap('key_read')
+        return signer.sign_batch(self.requests, self.message_id)
+
+    def parse_response(self, response, certificate, result_tag='TransactionResult'):
+        """
+        Checks the signature of the batched response once and returns one
+        response dataclass per request, in the order of the requests.
+        Every `result_tag` element is the result of one Transaction; it is
+        matched to its request by its id attribute or OrderID, or by position
+        if no result has either. Raises InvalidInput for a result that matches
+        no request and for a request without a result.
+        """
+        timer = StageTimer('MessageBatch') if _hooks else None
+        trust_store = get_trust_store(certificate)
+        if timer: timer.lap('key_read')
+        root = _convert_response_to_xml(response)
+        if timer: timer.lap('tree_build')
+        signed_xml = verify_enveloped(root, trust_store, timer)
+
+        results = list(signed_xml.iter(result_tag))
+        if not results and len(self.requests) == 1:
+            results = [signed_xml]
+        header = _extract_fields(signed_xml, _HEADER_TAGS)
+        order_ids = [element.get('id') or element.findtext('.//OrderID') for element in results]
+        if not any(order_ids):
+            if len(results) != len(self.requests):
+                raise InvalidInput('Response has {} results for {} requests'.format(len(results), len(self.requests)))
+            elements = results
+        else:
+            by_order = {}
+            for element, order_id in zip(results, order_ids):
+                if not order_id:
+                    raise InvalidInput('Response has a result without id or OrderID')
+                by_order.setdefault(order_id, []).append(element)
+            elements = []
+            for request in self.requests:
+                matches = by_order.get(request.order_id)
+                if not matches:
+                    raise InvalidInput('Response has no result for order {}'.format(request.order_id))
+                elements.append(matches.pop(0))
+            unmatched = [order_id for order_id, matches in by_order.items() if matches]
+            if unmatched:
+                raise InvalidInput('Response has results for unknown orders {}'.format(', '.join(unmatched)))
+
+        parsed = []
+        for request, element in zip(self.requests, elements):
+            response_class = _RESPONSE_CLASSES[type(request)]
+            values = _extract_fields(element, _field_tags(response_class))
+            for name in ('merchant_id', 'terminal_id'):
+                if name in values and not values[name]:
+                    values[name] = header[name]
+            if 'order_id' in values and not values['order_id']:
+                values['order_id'] = element.get('id') or request.order_id
+            parsed.append(response_class(**values))
+        if timer: timer.lap('fields')
+        return parsed
@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+from urllib.parse import unquote_plus
+
+from .exceptions import AltCurrencyAmountNullException, InvalidInput, InvalidSignature
+from .records import Record, slotted
+from .truststore import get_trust_store
+from .Upc_payment import _response_data
+
+# form field of the gateway notification -> PaymentNotification field
+_NOTIFICATION_FIELDS = {
+    'MerchantID': 'merchant_id',
+    'TerminalID': 'terminal_id',
+    'OrderID': 'order_id',
+    'PurchaseTime': 'purchase_time',
+    'Currency': 'currency',
+    'TotalAmount': 'total_amount',
+    'XID': 'xid',
+    'TranCode': 'tran_code',
+    'ApprovalCode': 'approval_code',
+    'Rrn': 'rrn',
+    'SD': 'sd',
+    'Delay': 'delay',
+    'AltCurrency': 'alt_currency',
+    'AltTotalAmount': 'alt_total_amount',
+    'ProxyPan': 'proxy_pan',
+    'Signature': 'signature',
+}
+_REQUIRED_FIELDS = ('MerchantID', 'TerminalID', 'OrderID', 'PurchaseTime', 'Currency', 'TotalAmount', 'XID',
+                    'TranCode', 'Signature')
+
+
+@slotted
+@dataclass(frozen=True, order=True)
+class PaymentNotification(Record):
+    merchant_id: str
+    terminal_id: str
+    order_id: str
+    purchase_time: str
+    currency: str
+    total_amount: str
+    xid: str
+    tran_code: str
+    signature: str
+    approval_code: str = ''
+    rrn: str = ''
+    sd: str = ''
+    delay: str = ''
+    alt_currency: str = ''
+    alt_total_amount: str = ''
+    proxy_pan: str = ''
+
+    def signed_data(self):
+        """
+        The string signed by the gateway, the same as Upc_payment.check_response_signature checks.
+        Raises AltCurrencyAmountNullException if only one of AltCurrency/AltTotalAmount is given.
+        """
+        return _response_data(self.merchant_id, self.terminal_id, self.purchase_time, self.order_id, self.delay,
+                              self.xid, self.currency, self.total_amount, self.alt_currency, self.alt_total_amount,
+                              self.sd, self.tran_code, self.approval_code)
+
+
+def _parse_form(body):
+    # parse_qsl unquotes every name and value; here only the ones that need it are
+    fields = {}
+    for pair in body.split('&'):
+        name, _, value = pair.partition('=')
+        if '%' in name or '+' in name:
+            name = unquote_plus(name)
+        if '%' in value or '+' in value:
+            value = unquote_plus(value)
+        fields[name] = value
+    return fields
+
+def parse_notification(fields):
+    """
+    Builds a PaymentNotification from the POSTed form: a mapping (e.g.
+    request.POST) or the urlencoded body as bytes/str.
+    """
+    if isinstance(fields, bytes):
+        try:
+            fields = fields.decode('utf-8')
+        except UnicodeDecodeError:
+            raise InvalidInput('Notification is not utf-8')
+    if isinstance(fields, str):
+        fields = _parse_form(fields)
+    for name in _REQUIRED_FIELDS:
+        if name not in fields:
+            raise InvalidInput('Notification has no {}'.format(name))
+    return PaymentNotification(**{attr: fields[name] for name, attr in _NOTIFICATION_FIELDS.items()
+                                  if name in fields})
+
+
+class NotificationVerifier(object):
+    """
+    Checks PaymentPage notifications of the gateway against its
+    certificate(s), parsed once: `certificate` is anything TrustStore accepts
+    or a TrustStore. One check is a single RSA-SHA1 verification.
+    """
+    def __init__(self, certificate):
+        self.trust_store = get_trust_store(certificate)
+
+    def verify(self, fields):
+        """
+        Returns the PaymentNotification of the form (see parse_notification),
+        raises InvalidSignature if it is not signed by the gateway and
+        InvalidInput if it is malformed.
+        """
+        notification = parse_notification(fields)
+        try:
+            data = notification.signed_data()
+        except AltCurrencyAmountNullException as exc:
+            raise InvalidInput(str(exc))
+        self.trust_store.verify(data, notification.signature)
+        return notification
+
+    def _check(self, body):
+        # (HTTP status, notification) or (HTTP status, error text)
+        try:
+            return '200 OK', self.verify(body)
+        except InvalidSignature as exc:
+            return '403 Forbidden', str(exc).encode('utf-8')
+        except InvalidInput as exc:
+            return '400 Bad Request', str(exc).encode('utf-8')
+
+    def wsgi_app(self, handler):
+        """
+        WSGI application for the notification URL: calls handler(notification)
+        for verified notifications and answers with the str/bytes it returns;
+        answers 403 to notifications that fail the check and 400 to malformed ones.
+        """
+        def app(environ, start_response):
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            status, answer = self._check(environ['wsgi.input'].read(length))
+            if status != '200 OK':
+                start_response(status, [('Content-Type', 'text/plain; charset=utf-8')])
+                return [answer]
+            body = _encode(handler(answer))
+            start_response(status, [('Content-Type', 'text/plain; charset=utf-8'),
+                                      ('Content-Length', str(len(body)))])
+            return [body]
+        return app
+
+    def asgi_app(self, handler):
+        """
+        ASGI version of wsgi_app; `handler` may be a coroutine function.
+        Answers lifespan events, raises ValueError for other scopes than http.
+        """
+        async def app(scope, receive, send):
+            if scope['type'] == 'lifespan':
+                while True:
+                    message = await receive()
+                    if message['type'] == 'lifespan.startup':
+                        await send({'type': 'lifespan.startup.complete'})
+                    elif message['type'] == 'lifespan.shutdown':
+                        await send({'type': 'lifespan.shutdown.complete'})
+                        return
+            if scope['type'] != 'http':
+                raise ValueError('Unsupported ASGI scope {!r}'.format(scope['type']))
+            body = b''
+            while True:
+                message = await receive()
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    break
+            status, answer = self._check(body)
+            if status == '200 OK':
+                answer = handler(answer)
+                if hasattr(answer, '__await__'):
+                    answer = await answer
+                answer = _encode(answer)
+            await send({'type': 'http.response.start', 'status': int(status[:3]),
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                                    (b'content-length', str(len(answer)).encode('ascii'))]})
+            await send({'type': 'http.response.body', 'body': answer})
+        return app
+
+
+def _encode(answer):
+    if answer is None:
+        return b''
+    if isinstance(answer, str):
+        return answer.encode('utf-8')
+    return answer
@@ -0,0 +1,93 @@
+import csv
+import json
+import os
+from dataclasses import asdict, fields
+from itertools import islice
+
+from .batch import sign_many
+from .signer import get_signer
+from .Upc_payment_xml import SettlementRefundRequest
+
+_SETTLEMENT_REFUND_FIELDS = tuple(field.name for field in fields(SettlementRefundRequest))
+
+
+def read_rows(source, format='csv', start_row=0):
+    """
+    Yields rows of a CSV (with header) or NDJSON file as dicts, one at a time,
+    skipping the first `start_row` rows. `source` is a path or a text file.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline='' if format == 'csv' else None, encoding='utf-8') as source_file:
+            yield from read_rows(source_file, format, start_row)
+        return
+    if format == 'csv':
+        rows = csv.DictReader(source)
+    elif format == 'ndjson':
+        rows = (json.loads(line) for line in source if line.strip())
+    else:
+        raise ValueError('format must be "csv" or "ndjson"')
+    yield from islice(rows, start_row, None)
+
+def settlement_refund_requests(rows):
+    for row in rows:
+        yield SettlementRefundRequest(**{name: str(row[name]) for name in _SETTLEMENT_REFUND_FIELDS
+                                         if row.get(name) is not None})
+
+def sign_requests(requests, private_key, workers=None, mode='thread'):
+    if workers:
+        yield from sign_many(requests, private_key, workers=workers, mode=mode)
+        return
+    signer = get_signer(private_key)
+    for request in requests:
+        yield request, request.generate_xml_with_signature(signer)
+
+def _send_requests(requests, send, sink, rows_done, progress):
+    # a refund must not be sent twice: the row is written and checkpointed before it is sent
+    for request in requests:
+        sink.write(json.dumps({'row': rows_done, 'order_id': request.order_id, 'sending': True},
+                              ensure_ascii=False) + '\n')
+        sink.flush()
+        if progress is not None:
+            progress(rows_done + 1)
+        response = send(request)
+        sink.write(json.dumps(dict(asdict(response), row=rows_done), ensure_ascii=False) + '\n')
+        sink.flush()
+        rows_done += 1
+    return rows_done
+
+
+def process_settlement_refunds(source, sink, private_key=None, send=None, format='csv', start_row=0,
+                               workers=None, mode='thread', progress=None, progress_every=1000):
+    """
+    Builds a SettlementRefundRequest from every row of `source`, signs it
+    (or sends it with `send`, e.g. GatewaySession.send) and writes one
+    NDJSON line per row to the text file `sink`: the signed document, or
+    the response fields. Rows are processed one at a time, so memory use
+    does not depend on the input size.
+
+    progress(rows_done) is called every `progress_every` rows after the sink
+    is flushed; rows_done is the start_row to resume from after a crash.
+    With `send` every row is first written as {"row": ..., "order_id": ...,
+    "sending": true}, flushed and passed to progress, and only then sent, so
+    a resumed run never sends a refund again. A "sending" line without a
+    response line after it is a refund the gateway may or may not have got -
+    check it with TransactionStateRequest.
+    Returns the number of rows done.
+    """
+    requests = settlement_refund_requests(read_rows(source, format, start_row))
+    if send is not None:
+        return _send_requests(requests, send, sink, start_row, progress)
+
+    rows_done = start_row
+    for request, result in sign_requests(requests, private_key, workers, mode):
+        record = {'row': rows_done, 'order_id': request.order_id, 'xml': result.decode('utf-8')}
+        sink.write(json.dumps(record, ensure_ascii=False) + '\n')
+        rows_done += 1
+        if progress is not None and rows_done % progress_every == 0:
+            sink.flush()
+            progress(rows_done)
+
+    sink.flush()
+    if progress is not None and rows_done % progress_every:
+        progress(rows_done)
+    return rows_done
@@ -0,0 +1,134 @@
+import heapq
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .exceptions import PollingIncomplete
+from .lazy import lazy_import
+from .state_cache import is_pending
+
+asyncio = lazy_import('asyncio')
+
+
+def _next_check(now, attempt, interval, max_interval, factor):
+    # exponential with a cap; the jitter spreads orders that went pending together
+    delay = min(max_interval, interval * factor ** attempt)
+    return now + random.uniform(delay / 2, delay)
+
+def _incomplete(schedule, running, failed):
+    # (number, request) of the orders left, in the order they were given
+    pending = sorted([entry[1:3] for entry in schedule] + [entry[:2] for entry in running.values()],
+                     key=lambda entry: entry[0])
+    if pending or failed:
+        raise PollingIncomplete([request for _, request in pending], failed)
+
+
+async def poll_states(requests, send, concurrency=10, interval=1.0, max_interval=60.0, factor=2.0,
+                      pending_codes=(), timeout=None):
+    """
+    Checks the state of every TransactionStateRequest with `send` (e.g.
+    AsyncGatewayClient.send) until it is final and yields the final
+    TransactionStateResponses as they come. An order still pending is checked
+    again after `interval`, `interval * factor`, ... seconds, at most
+    `max_interval`; at most `concurrency` checks run at a time. Connection
+    errors count as pending; an order whose response fails to parse or
+    verify (ValueError, e.g. InvalidSignature) is not checked again. Stops
+    after `timeout` seconds, if given. When every other order is done,
+    raises PollingIncomplete with the orders still pending and the failed ones.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + timeout if timeout is not None else None
+    schedule = [(start, number, request, 0) for number, request in enumerate(requests)]
+    heapq.heapify(schedule)
+    running = {}
+    failed = []
+    try:
+        while schedule or running:
+            now = loop.time()
+            if deadline is not None and now >= deadline:
+                break
+            while schedule and len(running) < concurrency and schedule[0][0] <= now:
+                _, number, request, attempt = heapq.heappop(schedule)
+                running[asyncio.ensure_future(send(request))] = (number, request, attempt)
+
+            wake_up = deadline
+            if schedule and len(running) < concurrency:
+                wake_up = schedule[0][0] if wake_up is None else min(wake_up, schedule[0][0])
+            wait_for = None if wake_up is None else max(wake_up - now, 0)
+            if not running:
+                await asyncio.sleep(wait_for)
+                continue
+            done, _ = await asyncio.wait(running, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                number, request, attempt = running.pop(task)
+                try:
+                    response = task.result()
+                except (OSError, asyncio.TimeoutError):
+                    response = None
+                except ValueError as exc:
+                    failed.append((request, exc))
+                    continue
+                if response is not None and not is_pending(response, pending_codes):
+                    yield response
+                else:
+                    heapq.heappush(schedule, (_next_check(loop.time(), attempt, interval, max_interval, factor),
+                                              number, request, attempt + 1))
+        _incomplete(schedule, running, failed)
+    finally:
+        for task in running:
+            task.cancel()
+
+
+def poll_states_threaded(requests, send, workers=10, interval=1.0, max_interval=60.0, factor=2.0,
+                         pending_codes=(), timeout=None):
+    """
+    poll_states for a blocking `send` (e.g. GatewaySession.send), with
+    `workers` threads. A generator of the final TransactionStateResponses;
+    raises PollingIncomplete like poll_states.
+    """
+    start = time.monotonic()
+    deadline = start + timeout if timeout is not None else None
+    schedule = [(start, number, request, 0) for number, request in enumerate(requests)]
+    heapq.heapify(schedule)
+    running = {}
+    failed = []
+    executor = ThreadPoolExecutor(workers)
+    try:
+        while schedule or running:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            while schedule and len(running) < workers and schedule[0][0] <= now:
+                _, number, request, attempt = heapq.heappop(schedule)
+                running[executor.submit(send, request)] = (number, request, attempt)
+
+            wake_up = deadline
+            if schedule and len(running) < workers:
+                wake_up = schedule[0][0] if wake_up is None else min(wake_up, schedule[0][0])
+            wait_for = None if wake_up is None else max(wake_up - now, 0)
+            if not running:
+                time.sleep(wait_for)
+                continue
+            done, _ = wait(running, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                number, request, attempt = running.pop(future)
+                try:
+                    response = future.result()
+                except OSError:
+                    response = None
+                except ValueError as exc:
+                    failed.append((request, exc))
+                    continue
+                if response is not None and not is_pending(response, pending_codes):
+                    yield response
+                else:
+                    heapq.heappush(schedule, (_next_check(time.monotonic(), attempt, interval, max_interval, factor),
+                                              number, request, attempt + 1))
+        _incomplete(schedule, running, failed)
+    finally:
+        for future in running:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -0,0 +1,145 @@
+import os
+from decimal import Decimal, InvalidOperation
+
+from .pipeline import read_rows
+
+MATCHED = 'matched'
+AMOUNT_MISMATCH = 'amount_mismatch'
+MISSING_IN_STATEMENT = 'missing_in_statement'
+MISSING_IN_RESPONSES = 'missing_in_responses'
+
+
+def _clean(value):
+    return '' if value is None else str(value).strip()
+
+def _amount(value):
+    value = _clean(value)
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return value
+
+def _response_values(keys):
+    def values(item):
+        # a response or a (response, amount) pair
+        response, amount = item if isinstance(item, tuple) else (item, None)
+        return tuple(_clean(getattr(response, key, '')) for key in keys), _amount(amount)
+    return values
+
+def _row_values(keys, columns, amount_column):
+    names = [columns.get(key, key) for key in keys]
+
+    def values(row):
+        return tuple(_clean(row.get(name)) for name in names), _amount(row.get(amount_column))
+    return values
+
+
+class _Index(object):
+    """
+    Hash index of one side of the join by every key; a value maps to the
+    position of its item, or to a list of positions if several items share it.
+    """
+    def __init__(self, size):
+        self.keys = [{} for _ in range(size)]
+        self.items = []
+        self.values = []
+        self.amounts = []
+        self.matched = bytearray()
+
+    def add(self, item, values, amount):
+        number = len(self.items)
+        self.items.append(item)
+        self.values.append(values)
+        self.amounts.append(amount)
+        self.matched.append(0)
+        for index, value in zip(self.keys, values):
+            if not value:
+                continue
+            found = index.get(value)
+            if found is None:
+                index[value] = number
+            elif type(found) is int:
+                index[value] = [found, number]
+            else:
+                found.append(number)
+
+    def _consistent(self, number, values):
+        # keys known on both sides must agree, e.g. an approval code shared by two orders
+        return all(not mine or not theirs or mine == theirs for mine, theirs in zip(self.values[number], values))
+
+    def find(self, values):
+        for index, value in zip(self.keys, values):
+            if not value:
+                continue
+            found = index.get(value)
+            if found is None:
+                continue
+            for number in ((found,) if type(found) is int else found):
+                if not self.matched[number] and self._consistent(number, values):
+                    self.matched[number] = 1
+                    return number
+        return None
+
+
+def reconcile(responses, statement, format='csv', keys=('rrn', 'approval_code', 'order_id'), columns=None,
+              amount_column='amount', index='responses'):
+    """
+    Matches parsed responses (e.g. AuthorizationResponse, RefundResponse,
+    PostAuthorizationResponse) against the rows of a gateway statement in
+    one pass and yields (status, response, row) for every response and row:
+    MATCHED, AMOUNT_MISMATCH, MISSING_IN_STATEMENT (row is None) or
+    MISSING_IN_RESPONSES (response is None).
+
+    A row matches the first unmatched response with the same value of
+    `keys`, tried in order, whose other keys do not differ. Statement
+    columns are named like the keys, `columns` maps a key to another column
+    name. Amounts are compared if the row has `amount_column` and the
+    response is given as a (response, amount) pair.
+
+    `statement` is a path or text file (`format` 'csv' or 'ndjson', see
+    pipeline.read_rows) or an iterable of dicts. One side is held in hash
+    indexes and the other is streamed: pass index='statement' when the
+    statement is the smaller side. Unmatched items of the indexed side are
+    yielded at the end.
+    """
+    if index not in ('responses', 'statement'):
+        raise ValueError('index must be "responses" or "statement"')
+    if isinstance(statement, (str, os.PathLike)) or hasattr(statement, 'read'):
+        statement = read_rows(statement, format)
+    response_values = _response_values(keys)
+    row_values = _row_values(keys, columns or {}, amount_column)
+    response_of = lambda item: item[0] if isinstance(item, tuple) else item
+
+    if index == 'responses':
+        indexed, indexed_values, streamed, streamed_values = responses, response_values, statement, row_values
+    else:
+        indexed, indexed_values, streamed, streamed_values = statement, row_values, responses, response_values
+
+    table = _Index(len(keys))
+    for item in indexed:
+        table.add(item, *indexed_values(item))
+
+    for item in streamed:
+        values, amount = streamed_values(item)
+        number = table.find(values)
+        if index == 'responses':
+            response, row = (None if number is None else response_of(table.items[number])), item
+        else:
+            response, row = response_of(item), (None if number is None else table.items[number])
+        if number is None:
+            yield (MISSING_IN_RESPONSES, None, row) if index == 'responses' else (MISSING_IN_STATEMENT, response, None)
+            continue
+        other = table.amounts[number]
+        if amount is not None and other is not None and amount != other:
+            yield AMOUNT_MISMATCH, response, row
+        else:
+            yield MATCHED, response, row
+
+    for number, item in enumerate(table.items):
+        if not table.matched[number]:
+            if index == 'responses':
+                yield MISSING_IN_STATEMENT, response_of(item), None
+            else:
+                yield MISSING_IN_RESPONSES, None, item
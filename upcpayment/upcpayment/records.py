@@ -0,0 +1,112 @@
+from dataclasses import MISSING, FrozenInstanceError, fields
+
+
+class Record(object):
+    """
+    Base of the request/response dataclasses. With the `slotted` decorator
+    instances have no __dict__ and are built without the frozen __setattr__ checks,
+    and the class gets the bulk constructors:
+
+    from_row(row)         - an instance from a tuple of values in field order
+    from_records(records) - a list of instances from tuples (in field order)
+                            or dicts (by field name)
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        return type(self), tuple(getattr(self, name) for name in self.__slots__)
+
+
+def _freeze(cls, names):
+    # the dataclass __setattr__/__delattr__ refer to the class they were made for, not to its slotted copy
+    def __setattr__(self, name, value):
+        if type(self) is cls or name in names:
+            raise FrozenInstanceError('cannot assign to field {!r}'.format(name))
+        super(cls, self).__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if type(self) is cls or name in names:
+            raise FrozenInstanceError('cannot delete field {!r}'.format(name))
+        super(cls, self).__delattr__(name)
+
+    for method in (__setattr__, __delattr__):
+        method.__qualname__ = '{}.{}'.format(cls.__qualname__, method.__name__)
+        setattr(cls, method.__name__, method)
+
+
+def slotted(cls):
+    """
+    Recreates a frozen Record dataclass with __slots__ (like dataclass(slots=True)
+    of Python 3.10+) and replaces its __init__ with one that writes the slots
+    directly; instances stay immutable and raise FrozenInstanceError like
+    frozen dataclasses do.
+    """
+    names = tuple(field.name for field in fields(cls))
+    namespace = {key: value for key, value in cls.__dict__.items()
+                 if key not in names and key not in ('__dict__', '__weakref__')}
+    namespace['__slots__'] = names
+    slotted_cls = type(cls)(cls.__name__, cls.__bases__, namespace)
+    slotted_cls.__qualname__ = cls.__qualname__
+    if cls.__dataclass_params__.frozen:
+        _freeze(slotted_cls, frozenset(names))
+
+    # the bulk constructors fill an instance of a plain class with the same slots, where
+    # attribute stores are cheap, and then give it the frozen class (same layout)
+    builder = type(cls.__name__ + 'Builder', cls.__bases__, {'__slots__': names})
+    scope = {'_new': object.__new__, '_cls': slotted_cls, '_builder': builder, '_dict': dict}
+    params, body = [], []
+    for index, field in enumerate(fields(cls)):
+        scope['_set_{}'.format(index)] = getattr(slotted_cls, field.name).__set__
+        if field.default is not MISSING:
+            scope['_default_{}'.format(index)] = field.default
+            params.append('{}=_default_{}'.format(field.name, index))
+        else:
+            params.append(field.name)
+        body.append('    _set_{}(self, {})\n'.format(index, field.name))
+    targets = ''.join('self.{}, '.format(name) for name in names)
+    keys = ''.join('record[{!r}], '.format(name) for name in names)
+    source = ('def __init__(self, {params}):\n{body}'
+              'def _make({params}):\n    self = _new(_cls)\n{body}    return self\n'
+              'def _from_dict(record):\n'
+              '    if len(record) == {count}:\n'
+              '        try:\n'
+              '            values = {keys}\n'
+              '        except KeyError:\n'
+              '            pass\n'
+              '        else:\n'
+              '            self = _new(_builder)\n'
+              '            {targets}= values\n'
+              '            self.__class__ = _cls\n'
+              '            return self\n'
+              '    return _make(**record)\n'
+              'def from_row(row):\n'
+              '    if len(row) != {count}:\n'
+              '        return _make(*row)\n'
+              '    self = _new(_builder)\n'
+              '    {targets}= row\n'
+              '    self.__class__ = _cls\n'
+              '    return self\n'
+              'def from_records(records):\n'
+              '    result = []\n'
+              '    append = result.append\n'
+              '    for record in records:\n'
+              '        if type(record) is _dict:\n'
+              '            append(_from_dict(record))\n'
+              '        elif len(record) == {count}:\n'
+              '            self = _new(_builder)\n'
+              '            {targets}= record\n'
+              '            self.__class__ = _cls\n'
+              '            append(self)\n'
+              '        else:\n'
+              '            append(_from_dict(record) if isinstance(record, _dict) else _make(*record))\n'
+              '    return result\n').format(params=', '.join(params), body=''.join(body), count=len(names),
+                                           keys=keys, targets=targets)
+    exec(source, scope)
+
+    scope['__init__'].__qualname__ = cls.__qualname__ + '.__init__'
+    slotted_cls.__init__ = scope['__init__']
+    slotted_cls._make = staticmethod(scope['_make'])
+    for name in ('from_row', 'from_records'):
+        scope[name].__qualname__ = '{}.{}'.format(cls.__qualname__, name)
+        setattr(slotted_cls, name, staticmethod(scope[name]))
+    return slotted_cls
@@ -0,0 +1,74 @@
+# Generated requests and keys for load tests, benchmarks and tests
+
+import datetime
+import os
+from dataclasses import fields
+
+from .lazy import lazy_import
+
+hashes = lazy_import('cryptography.hazmat.primitives.hashes')
+oid = lazy_import('cryptography.x509.oid')
+rsa = lazy_import('cryptography.hazmat.primitives.asymmetric.rsa')
+serialization = lazy_import('cryptography.hazmat.primitives.serialization')
+x509 = lazy_import('cryptography.x509')
+
+
+# field values of generated requests
+SAMPLE_VALUES = {
+    'merchant_id': '1756190',
+    'terminal_id': 'E7884956',
+    'order_id': '1234567890',
+    'date': '20201010120000',
+    'total_amount': '10000',
+    'currency': '980',
+    'purchase_desc': 'Order description',
+    'card_num': '4111111111111111',
+    'exp_year': '25',
+    'exp_month': '12',
+    'cv_num': '123',
+    'status': 'Y',
+    'cavv': 'AAABBJkZUQAAAABTBBlRAAAAAAA=',
+    'eci': '05',
+    'cavv_alg': '2',
+    'approval_code': 'A1B2C3',
+    'rrn': '123456789012',
+    'refund_amount': '10000',
+    'postauth_amount': '10000',
+    'ref3': 'ref3',
+    'wallet_id': '101',
+    'callid': '3287462874628746',
+    'tavv': 'AAABBJkZUQAAAABTBBlRAAAAAAA=',
+    'upctoken': '',
+    'device_category': '0',
+    'posconditioncode': '59',
+}
+
+
+def sample_request(request_class, **values):
+    """
+    Request of `request_class` filled with SAMPLE_VALUES, `values` override them.
+    """
+    values = dict(SAMPLE_VALUES, **values)
+    return request_class(**{field.name: values[field.name] for field in fields(request_class)})
+
+
+def generate_key_file(directory, name='test'):
+    """
+    Writes a test private key and a self-signed certificate for it,
+    returns (key_path, cert_path).
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_path = os.path.join(os.fspath(directory), name + '_key.pem')
+    with open(key_path, 'wb') as key_file:
+        key_file.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                                         serialization.NoEncryption()))
+
+    subject = x509.Name([x509.NameAttribute(oid.NameOID.COMMON_NAME, name)])
+    now = datetime.datetime.utcnow()
+    cert = (x509.CertificateBuilder().subject_name(subject).issuer_name(subject).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+    cert_path = os.path.join(os.fspath(directory), name + '_cert.pem')
+    with open(cert_path, 'wb') as cert_file:
+        cert_file.write(cert.public_bytes(serialization.Encoding.PEM))
+    return key_path, cert_path
@@ -0,0 +1,254 @@
+import re
+from operator import attrgetter
+
+_TEXT, _ATTR, _IF = 0, 1, 2
+
+_ROOT_NAMESPACES = (' xmlns:xenc="http://www.w3.org/2001/04/xmlenc#"'
+                    ' xmlns:ds="http://www.w3.org/2000/09/xmldsig#"'
+                    ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+                    ' xmlns:noNamespaceSchemaLocation="https://secure.upc.ua/go/pub/schema/xmlpay-1.21.xsd"')
+
+_INVALID_CHARS = '\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff'
+_INVALID = re.compile('[' + _INVALID_CHARS + ']')
+_TEXT_SPECIAL = re.compile('[&<>\r' + _INVALID_CHARS + ']')
+_ATTR_SPECIAL = re.compile('[&<"\t\n\r' + _INVALID_CHARS + ']')
+# escaping rules of (exclusive) canonical XML
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '\r': '&#xD;'})
+_ATTR_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '"': '&quot;', '\t': '&#x9;', '\n': '&#xA;', '\r': '&#xD;'})
+
+
+def _escape(value, special, escapes):
+    if type(value) is not str:
+        if value is None:
+            return ''
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        elif isinstance(value, str):
+            value = str(value)
+        else:
+            raise TypeError("Argument must be bytes or unicode, got '{}'".format(type(value).__name__))
+    if special.search(value) is None:
+        return value
+    if _INVALID.search(value) is not None:
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters')
+    return value.translate(escapes)
+
+
+class _Fixed(str):
+    pass
+
+
+def _merge(ops):
+    merged = []
+    for op in ops:
+        if type(op) is str and merged and type(merged[-1]) is str:
+            merged[-1] += op
+        else:
+            merged.append(str(op) if isinstance(op, str) else op)
+    return merged
+
+def _el(tag, *content, text=None, attrs=(), when=None):
+    ops = ['<' + tag]
+    for name, value in attrs:
+        if isinstance(value, _Fixed):
+            ops.append(' {}="{}"'.format(name, value))
+        else:
+            ops += [' {}="'.format(name), (_ATTR, attrgetter(value)), '"']
+    ops.append('>')
+    if text is not None:
+        ops.append((_TEXT, attrgetter(text)))
+    for item in content:
+        if isinstance(item, str):
+            ops.append(item)
+        else:
+            ops.extend(item)
+    ops.append('</{}>'.format(tag))
+    if when is not None:
+        return [(_IF, attrgetter(when), _merge(ops), [])]
+    return ops
+
+def _either(field, then, otherwise):
+    return [(_IF, attrgetter(field), _merge(then), _merge(otherwise))]
+
+def _render(ops, obj, out):
+    for op in ops:
+        if type(op) is str:
+            out.append(op)
+        elif op[0] == _TEXT:
+            out.append(_escape(op[1](obj), _TEXT_SPECIAL, _TEXT_ESCAPES))
+        elif op[0] == _ATTR:
+            out.append(_escape(op[1](obj), _ATTR_SPECIAL, _ATTR_ESCAPES))
+        elif op[1](obj):
+            _render(op[2], obj, out)
+        else:
+            _render(op[3], obj, out)
+
+
+def _invoice(description=True):
+    return _el('Invoice',
+               _el('OrderID', text='order_id'),
+               _el('Date', text='date'),
+               _el('TotalAmount', text='total_amount'),
+               _el('Currency', text='currency'),
+               _el('Description', text='purchase_desc', when='purchase_desc') if description else ())
+
+def _card(cv_num=True, tavv=False):
+    return _el('Card',
+               _el('CardNum', text='card_num'),
+               _el('ExpYear', text='exp_year'),
+               _el('ExpMonth', text='exp_month'),
+               _el('CVNum', text='cv_num', when='cv_num') if cv_num else (),
+               _el('ExtDataToken', _el('TAVV', text='tavv'), when='tavv') if tavv else ())
+
+def _pares():
+    return _el('PARes',
+               _el('Status', text='status'),
+               _el('CAVV', text='cavv'),
+               _el('ECI', text='eci'),
+               _el('CavvAlgorithm', text='cavv_alg'))
+
+def _visa_checkout():
+    return _el('Wallet', _el('VISACheckout', _el('CallID', text='callid')))
+
+def _xmlpay(*transaction):
+    return _el('Message',
+               _el('XMLPayRequest',
+                   _el('RequestData',
+                       _el('MerchantID', text='merchant_id'),
+                       _el('TerminalID', text='terminal_id'),
+                       _el('Transactions', *transaction))),
+               attrs=(('id', 'order_id'), ('version', _Fixed('1.0'))))
+
+def _transaction(*content):
+    return _el('Transaction', *content, attrs=(('id', 'order_id'),))
+
+def _xmlmpi(*mpi_request):
+    return _el('Message',
+               _el('XMLMPIRequest',
+                   _el('MerchantID', text='merchant_id'),
+                   _el('TerminalID', text='terminal_id'),
+                   _el('MPIRequest', *mpi_request, attrs=(('id', 'order_id'),))),
+               attrs=(('id', 'order_id'), ('version', _Fixed('1.0'))))
+
+
+# XMLPay requests: the Transaction element, which can be put into a Message with others
+_TRANSACTIONS = {
+    'AuthorizationRequest': _transaction(_el('Authorization', _el('PayData', _invoice(), _card(), _pares()))),
+    'RefundRequest': _transaction(
+        _el('Refund',
+            _el('RefundData',
+                _invoice(),
+                _el('AuthorizationRef', _el('ApprovalCode', text='approval_code'), _el('Rrn', text='rrn')),
+                _el('RefundAmount', text='refund_amount')))),
+    'PreAuthorizationRequest': _transaction(
+        _el('Preauthorization',
+            _el('PayData', _invoice(), _card(), _pares(), _el('Walletid', text='wallet_id', when='wallet_id')))),
+    'PostAuthorizationRequest': _transaction(
+        _el('Postauthorization',
+            _el('PostauthorizationData',
+                _invoice(),
+                _el('PreauthorizationRef', _el('ApprovalCode', text='approval_code'), _el('Rrn', text='rrn')),
+                _el('PostauthorizationAmount', text='postauth_amount')))),
+    'TransactionStateRequest': _transaction(
+        _el('TransactionStateReq', _el('TransactionStateReqData', _invoice(description=False)))),
+    'AccountVerificationRequest': _transaction(_el('Authorization', _el('PayData', _invoice(), _card()))),
+    'RecurrentRequest': _transaction(
+        _el('Authorization', _el('PayData', _invoice(), _card(), _el('Recurrent', 'true')))),
+    'SettlementRefundRequest': _transaction(
+        _el('Settlement',
+            _el('SettlementRefundData',
+                _invoice(),
+                _card(cv_num=False),
+                _el('ApprovalCode', text='approval_code', when='approval_code'),
+                _el('Rrn', text='rrn', when='rrn'),
+                _el('ECI', text='eci', when='eci'),
+                _el('PosConditionCode', text='posconditioncode', when='posconditioncode'),
+                _el('Ref3', text='ref3')))),
+    'MasterPassAuthorizationRequest': _transaction(
+        _el('Authorization', _el('PayData', _invoice(), _card(), _pares(), _el('Walletid', text='wallet_id')))),
+    'VisaCheckoutAuthorizationRequest': _transaction(
+        _el('Authorization', _el('PayData', _invoice(), _el('Card', _visa_checkout())))),
+    'VisaCheckoutPCIAuthorizationRequest': _transaction(
+        _el('Authorization', _el('PayData', _invoice(), _card(), _pares(), _visa_checkout()))),
+    'AppleGooglePayAuthorizationRequest': _transaction(
+        _el('Authorization', _el('PayData', _invoice(), _card(cv_num=False, tavv=True)))),
+}
+
+_MESSAGES = {
+    'MPIEnrolRequest': _xmlmpi(
+        _el('MPIEnrolRequest',
+            _either('upctoken',
+                    _el('Token', _el('UpcToken', _el('TokenID', text='upctoken'))),
+                    _el('CardNum', text='card_num') + _el('ExpYear', text='exp_year') + _el('ExpMonth', text='exp_month')),
+            _el('TotalAmount', text='total_amount'),
+            _el('Currency', text='currency'),
+            _el('Description', text='purchase_desc'),
+            _el('DeviceCategory', text='device_category'))),
+    'MPIAuthRequest': _xmlmpi(_el('MPIAuthRequest', _pares())),
+}
+_MESSAGES.update((name, _xmlpay(transaction)) for name, transaction in _TRANSACTIONS.items())
+
+_SERIALIZERS = {name: (_merge(['<ECommerceConnect>'] + ops + ['</ECommerceConnect>']),
+                       _merge(['<ECommerceConnect' + _ROOT_NAMESPACES + '>'] + ops + ['</ECommerceConnect>']))
+                for name, ops in _MESSAGES.items()}
+
+# XMLPay Message around several Transactions: ops before and after them
+_TRANSACTION_SLOT = object()
+
+def _split_at_slot(ops):
+    index = ops.index(_TRANSACTION_SLOT)
+    return ops[:index], ops[index + 1:]
+
+_BATCH_SERIALIZERS = tuple(_split_at_slot(_merge([root] + _xmlpay([_TRANSACTION_SLOT]) + ['</ECommerceConnect>']))
+                           for root in ('<ECommerceConnect>', '<ECommerceConnect' + _ROOT_NAMESPACES + '>'))
+
+
+class _MessageHeader(object):
+    __slots__ = ('order_id', 'merchant_id', 'terminal_id')
+
+    def __init__(self, order_id, merchant_id, terminal_id):
+        self.order_id = order_id
+        self.merchant_id = merchant_id
+        self.terminal_id = terminal_id
+
+
+def serialize(request, canonical=True):
+    """
+    Writes the unsigned ECommerceConnect document of a Upc_payment_xml request
+    straight from its fields, without building an lxml tree.
+
+    With canonical=True the result is byte-identical to the exclusive c14n
+    of request.generate_xml(); with canonical=False the root element keeps
+    its namespace declarations, as the signed document needs them.
+    """
+    ops = _SERIALIZERS[type(request).__name__][0 if canonical else 1]
+    out = []
+    _render(ops, request, out)
+    return ''.join(out).encode('utf-8')
+
+
+def serialize_batch(requests, message_id=None, canonical=True):
+    """
+    Writes one XMLPay ECommerceConnect document with a Transaction for every
+    request, like serialize does for one. All requests must be XMLPay
+    requests of the same merchant/terminal; the Message id is `message_id`
+    or the order_id of the first request.
+    """
+    if not requests:
+        raise ValueError('Waited for at least one request')
+    first = requests[0]
+    for request in requests:
+        if type(request).__name__ not in _TRANSACTIONS:
+            raise TypeError('{} can not be put into a batch'.format(type(request).__name__))
+        if (request.merchant_id, request.terminal_id) != (first.merchant_id, first.terminal_id):
+            raise ValueError('All requests of a batch must have the same merchant_id and terminal_id')
+
+    head, tail = _BATCH_SERIALIZERS[0 if canonical else 1]
+    out = []
+    header = _MessageHeader(first.order_id if message_id is None else message_id,
+                            first.merchant_id, first.terminal_id)
+    _render(head, header, out)
+    for request in requests:
+        _render(_TRANSACTIONS[type(request).__name__], request, out)
+    _render(tail, header, out)
+    return ''.join(out).encode('utf-8')
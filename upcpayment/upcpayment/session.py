@@ -0,0 +1,175 @@
+import http.client
+import random
+import select
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .exceptions import GatewayError
+from .signer import get_signer
+from .truststore import get_trust_store
+from .Upc_payment_xml import TransactionStateRequest, parse_response
+
+_IDEMPOTENT_REQUESTS = (TransactionStateRequest,)
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class _ResumingHTTPSConnection(http.client.HTTPSConnection):
+    """
+    HTTPSConnection that resumes the TLS session of the previous connection
+    of the same pool, so new connections skip the full handshake.
+    """
+    def __init__(self, host, port, timeout, context, tls_sessions):
+        super().__init__(host, port, timeout=timeout, context=context)
+        self._tls_sessions = tls_sessions
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        server_hostname = self._tunnel_host or self.host
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname,
+                                              session=self._tls_sessions.session)
+        self._tls_sessions.session = self.sock.session
+
+
+class _TLSSessions(object):
+    session = None
+
+
+def _dropped(connection):
+    # an idle keep-alive connection has nothing to read unless the gateway closed it
+    sock = connection.sock
+    if sock is None:
+        return True
+    if hasattr(select, 'poll'):
+        poll = select.poll()
+        poll.register(sock, select.POLLIN)
+        return bool(poll.poll(0))
+    return bool(select.select([sock], [], [], 0)[0])
+
+
+class GatewaySession(object):
+    """
+    Thread-safe client for Upc_payment_xml requests. Keeps up to `pool_size`
+    keep-alive connections to the gateway, shared between threads.
+    Idempotent requests (TransactionStateRequest) are retried up to `retries`
+    times with jittered exponential backoff; others are sent once, and only
+    sent again on a new connection if the old one failed before the whole
+    request was written.
+    """
+    def __init__(self, url, private_key, certificate, pool_size=10, timeout=30.0, retries=3, backoff=0.1,
+                 max_backoff=2.0, ssl_context=None, headers=None):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.headers = {'Content-Type': 'text/xml; charset=utf-8', 'Connection': 'keep-alive'}
+        self.headers.update(headers or {})
+        self._signer = get_signer(private_key)
+        self._trust_store = get_trust_store(certificate)
+
+        parts = urlsplit(url)
+        self._https = parts.scheme == 'https'
+        self._host = parts.hostname
+        self._port = parts.port or (443 if self._https else 80)
+        self._target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self._ssl_context = ssl_context or (ssl.create_default_context() if self._https else None)
+        self._tls_sessions = _TLSSessions()
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _new_connection(self):
+        if self._https:
+            return _ResumingHTTPSConnection(self._host, self._port, self.timeout, self._ssl_context, self._tls_sessions)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise GatewayError('No free connection in the pool')
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                return self._new_connection(), False
+            if not _dropped(connection):
+                return connection, True
+            connection.close()
+
+    def _release(self, connection, keep_alive):
+        if self._https and connection.sock is not None:
+            # TLS 1.3 session tickets arrive after the handshake
+            self._tls_sessions.session = connection.sock.session
+        if keep_alive:
+            with self._lock:
+                self._idle.append(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+    def _post_once(self, body):
+        for attempt in (0, 1):
+            connection, reused = self._acquire()
+            try:
+                connection.request('POST', self._target, body, self.headers)
+            except _STALE_ERRORS:
+                self._release(connection, False)
+                # a reused keep-alive connection may have been closed by the gateway meanwhile;
+                # the request did not get through whole, so it is sent again
+                if reused and attempt == 0:
+                    continue
+                raise GatewayError('Connection closed by gateway')
+            except BaseException:
+                self._release(connection, False)
+                raise
+            try:
+                response = connection.getresponse()
+                data = response.read()
+            except _STALE_ERRORS:
+                self._release(connection, False)
+                # the gateway may have processed the request: post() sends it again only if idempotent
+                raise GatewayError('Connection closed by gateway')
+            except BaseException:
+                self._release(connection, False)
+                raise
+            self._release(connection, not response.will_close)
+            return response.status, data
+
+    def post(self, body, idempotent=False):
+        attempts = self.retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))))
+            try:
+                status, data = self._post_once(body)
+            except (OSError, http.client.HTTPException) as exc:
+                error = exc
+                continue
+            if status == 200:
+                return data
+            error = GatewayError('Gateway answered with HTTP {}'.format(status))
+            if status not in _RETRY_STATUSES:
+                break
+        raise error
+
+    def send(self, request, idempotent=None):
+        if idempotent is None:
+            idempotent = isinstance(request, _IDEMPOTENT_REQUESTS)
+        body = request.generate_xml_with_signature(self._signer)
+        response = self.post(body, idempotent)
+        return parse_response(request, response, self._trust_store)
+
+    def close(self):
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
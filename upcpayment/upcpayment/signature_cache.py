@@ -0,0 +1,49 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class SignatureCache(object):
+    """
+    PaymentPage signatures by the exact signed data string, for repeated
+    renders of the same checkout. Keeps at most `maxsize` signatures
+    (least recently used are dropped), each for `ttl` seconds.
+    A signature made with another key than the cached one is not reused.
+    """
+    def __init__(self, maxsize=10000, ttl=900.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._signatures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, data, key):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._signatures.get(data)
+            if cached is not None:
+                expires, cached_key, signature = cached
+                if expires > now and cached_key is key:
+                    self._signatures.move_to_end(data)
+                    self.hits += 1
+                    return signature
+                del self._signatures[data]
+            self.misses += 1
+            return None
+
+    def put(self, data, key, signature):
+        with self._lock:
+            self._signatures[data] = (time.monotonic() + self.ttl, key, signature)
+            self._signatures.move_to_end(data)
+            while len(self._signatures) > self.maxsize:
+                self._signatures.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._signatures.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._signatures)
@@ -0,0 +1,380 @@
+import argparse
+import os
+import signal
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# RemoteKey is a cryptography RSA key, so this one can not be imported lazily
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from . import batch
+from .exceptions import InvalidInput
+from .keyring import Keyring
+from .lazy import lazy_import
+
+asyncio = lazy_import('asyncio')
+hashes = lazy_import('cryptography.hazmat.primitives.hashes')
+padding = lazy_import('cryptography.hazmat.primitives.asymmetric.padding')
+serialization = lazy_import('cryptography.hazmat.primitives.serialization')
+
+# request: id, operation, sizes of merchant_id, terminal_id and data; then the three of them
+_REQUEST = struct.Struct('>IcBBI')
+# response: id, status (b'+' - signature or public key, b'-' - error message), size of the body; then the body
+_RESPONSE = struct.Struct('>IcI')
+
+_PUBLIC_KEY = b'k'
+# operation -> hash of the PKCS1v15 signature
+_SIGN_OPERATIONS = {b'1': 'SHA1', b'2': 'SHA256'}
+_HASH_OPERATIONS = {'sha1': b'1', 'sha256': b'2'}
+
+
+def _sign_in_worker(chunk):
+    # runs in a daemon process, with the key(s) loaded by batch._init_worker
+    results = []
+    for merchant_id, terminal_id, hash_name, data in chunk:
+        try:
+            key = batch._worker_key
+            if isinstance(key, Keyring):
+                key = key.get_key(merchant_id, terminal_id)
+            results.append((True, key.sign(data, padding.PKCS1v15(), getattr(hashes, hash_name)())))
+        except KeyError:
+            results.append((False, 'No key for merchant {} terminal {}'.format(merchant_id, terminal_id)))
+        except Exception as exc:
+            results.append((False, '{}: {}'.format(type(exc).__name__, exc)))
+    return results
+
+def _init_daemon_worker(shipped_key, parent):
+    batch._init_worker(shipped_key)
+    threading.Thread(target=_watch_parent, args=(parent,), daemon=True).start()
+
+def _watch_parent(parent):
+    # a worker holds the private key: it must not outlive the daemon, even one killed with SIGKILL
+    while os.getppid() == parent:
+        time.sleep(1)
+    os._exit(0)
+
+def _reply(writer, request_id, ok, body):
+    if not ok:
+        body = body.encode('utf-8')
+    writer.write(_RESPONSE.pack(request_id, b'+' if ok else b'-', len(body)) + body)
+
+
+class SigningDaemon(object):
+    """
+    Local signing service for pre-fork web servers: `workers` processes hold
+    the parsed private key (anything generate_xml_with_signature accepts, or
+    a Keyring) and sign for RemoteKey clients connected to the Unix socket at
+    `path`. Requests of all connections are queued together and handed to
+    the processes in chunks of at most `chunksize`, so the number of cores,
+    not the number of clients, sets the throughput.
+    The socket gets `mode` permissions before it accepts connections; keep it
+    in a directory only the web server user can access.
+    """
+    def __init__(self, path, private_key, workers=None, chunksize=16, mode=0o600):
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.mode = mode
+        self._key, self._shipped_key = batch._ship_key(private_key)
+        self._queue = deque()
+        self._running = 0
+        self._executor = None
+        self._server = None
+        self._loop = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._executor = ProcessPoolExecutor(self.workers, initializer=_init_daemon_worker,
+                                             initargs=(self._shipped_key, os.getpid()))
+        # start the processes before there are sockets for them to inherit
+        await self._loop.run_in_executor(self._executor, _sign_in_worker, [])
+        if os.path.exists(self.path):
+            # socket file left by a previous run
+            os.unlink(self.path)
+        # the socket gets its mode before it listens: until then nobody can connect to it
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.path)
+            os.chmod(self.path, self.mode)
+        except BaseException:
+            sock.close()
+            raise
+        self._server = await asyncio.start_unix_server(self._serve_connection, sock=sock)
+
+    async def serve_forever(self):
+        """
+        Serves until SIGTERM or SIGINT (or until cancelled), then stops the
+        worker processes and removes the socket.
+        """
+        if self._server is None:
+            await self.start()
+        stop = asyncio.Event()
+        handled = []
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                self._loop.add_signal_handler(signum, stop.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # not in the main thread, or a loop without signal support
+                continue
+            handled.append(signum)
+        try:
+            await stop.wait()
+        finally:
+            for signum in handled:
+                self._loop.remove_signal_handler(signum)
+            self.close()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._executor is not None:
+            # wait for the processes to exit, so none is left behind with the key
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _public_key(self, merchant_id, terminal_id):
+        key = self._key
+        if isinstance(key, Keyring):
+            key = key.get_key(merchant_id, terminal_id)
+        return key.public_key().public_bytes(serialization.Encoding.DER,
+                                             serialization.PublicFormat.SubjectPublicKeyInfo)
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_id, operation, merchant_size, terminal_size, data_size = _REQUEST.unpack(
+                    await reader.readexactly(_REQUEST.size))
+                body = await reader.readexactly(merchant_size + terminal_size + data_size)
+                merchant_id = body[:merchant_size].decode('utf-8')
+                terminal_id = body[merchant_size:merchant_size + terminal_size].decode('utf-8')
+                if operation in _SIGN_OPERATIONS:
+                    self._queue.append((writer, request_id, (merchant_id, terminal_id, _SIGN_OPERATIONS[operation],
+                                                             body[merchant_size + terminal_size:])))
+                    self._dispatch()
+                elif operation == _PUBLIC_KEY:
+                    try:
+                        _reply(writer, request_id, True, self._public_key(merchant_id, terminal_id))
+                    except KeyError:
+                        _reply(writer, request_id, False,
+                               'No key for merchant {} terminal {}'.format(merchant_id, terminal_id))
+                else:
+                    _reply(writer, request_id, False, 'Unknown operation {!r}'.format(operation))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self):
+        while self._queue and self._running < self.workers * 2:
+            # chunks are small while the queue is short, so a single request does not wait for others
+            size = max(1, min(self.chunksize, len(self._queue) // self.workers))
+            chunk = [self._queue.popleft() for _ in range(size)]
+            self._running += 1
+            future = self._executor.submit(_sign_in_worker, [payload for _, _, payload in chunk])
+            future.add_done_callback(lambda future, chunk=chunk: self._loop.call_soon_threadsafe(
+                self._finish, chunk, future))
+
+    def _finish(self, chunk, future):
+        self._running -= 1
+        try:
+            results = future.result()
+        except Exception as exc:
+            # e.g. a killed worker process
+            results = [(False, '{}: {}'.format(type(exc).__name__, exc))] * len(chunk)
+        for (writer, request_id, _), (ok, body) in zip(chunk, results):
+            if not writer.is_closing():
+                _reply(writer, request_id, ok, body)
+        if self._executor is not None:
+            self._dispatch()
+
+
+class SigningClient(object):
+    """
+    Connection of one process to a SigningDaemon, shared by its threads:
+    a request is written as soon as it is made and answers are matched to
+    requests by id, so many requests are in flight at once. Connects again
+    after fork (e.g. in every gunicorn worker) and after the connection is lost.
+    """
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._pid = None
+        self._pending = {}
+        self._next_id = 0
+        self._keys = {}
+
+    def key(self, merchant_id='', terminal_id=''):
+        """
+        RemoteKey of the merchant/terminal pair (the daemon's only key if the
+        daemon was started with a single key). The same object is returned
+        for the same pair, so signer and signature caches keep working.
+        """
+        with self._lock:
+            key = self._keys.get((merchant_id, terminal_id))
+            if key is None:
+                key = self._keys[(merchant_id, terminal_id)] = RemoteKey(self, merchant_id, terminal_id)
+        return key
+
+    def request(self, operation, merchant_id, terminal_id, data=b''):
+        merchant = merchant_id.encode('utf-8')
+        terminal = terminal_id.encode('utf-8')
+        future = Future()
+        with self._lock:
+            sock = self._connection()
+            pending = self._pending
+            self._next_id = (self._next_id + 1) & 0xffffffff
+            request_id = self._next_id
+            pending[request_id] = future
+            try:
+                sock.sendall(_REQUEST.pack(request_id, operation, len(merchant), len(terminal), len(data))
+                             + merchant + terminal + data)
+            except OSError:
+                del pending[request_id]
+                self._disconnect(sock)
+                raise
+        try:
+            return future.result(self.timeout)
+        finally:
+            with self._lock:
+                pending.pop(request_id, None)
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._disconnect(self._sock)
+
+    def _connection(self):
+        # called with self._lock held
+        if self._sock is not None and self._pid == os.getpid():
+            return self._sock
+        # a socket inherited over fork belongs to the parent's reader thread
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock, self._pid, self._pending = sock, os.getpid(), {}
+        threading.Thread(target=self._read, args=(sock, self._pending), daemon=True).start()
+        return sock
+
+    def _disconnect(self, sock):
+        # called with self._lock held; the reader thread fails the pending requests
+        if self._sock is sock:
+            self._sock = None
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _read(self, sock, pending):
+        stream = sock.makefile('rb')
+        try:
+            while True:
+                header = stream.read(_RESPONSE.size)
+                if len(header) < _RESPONSE.size:
+                    break
+                request_id, status, size = _RESPONSE.unpack(header)
+                body = stream.read(size)
+                with self._lock:
+                    future = pending.pop(request_id, None)
+                if future is None:
+                    continue
+                if status == b'+':
+                    future.set_result(body)
+                else:
+                    future.set_exception(InvalidInput(body.decode('utf-8')))
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                if self._sock is sock:
+                    self._sock = None
+                failed = list(pending.values())
+                pending.clear()
+            stream.close()
+            sock.close()
+            for future in failed:
+                future.set_exception(ConnectionError('Signing daemon closed the connection'))
+
+
+class RemoteKey(rsa.RSAPrivateKey):
+    """
+    Private key kept by a SigningDaemon. It is accepted everywhere a private
+    key is (generate_xml_with_signature, Upc_payment.generate_signature,
+    sign_many with mode='thread', ...): digests and xml are made locally, only
+    the RSA signature is computed by the daemon. The key can not be exported.
+    """
+    def __init__(self, client, merchant_id='', terminal_id=''):
+        self.client = client
+        self.merchant_id = merchant_id
+        self.terminal_id = terminal_id
+        self._public_key = None
+
+    def sign(self, data, pad, algorithm):
+        if not isinstance(pad, padding.PKCS1v15) or algorithm.name not in _HASH_OPERATIONS:
+            raise ValueError('Signing daemon signs only with PKCS1v15 and SHA1 or SHA256')
+        return self.client.request(_HASH_OPERATIONS[algorithm.name], self.merchant_id, self.terminal_id, data)
+
+    def public_key(self):
+        if self._public_key is None:
+            self._public_key = serialization.load_der_public_key(
+                self.client.request(_PUBLIC_KEY, self.merchant_id, self.terminal_id))
+        return self._public_key
+
+    @property
+    def key_size(self):
+        return self.public_key().key_size
+
+    def decrypt(self, ciphertext, pad):
+        raise TypeError('RemoteKey only signs')
+
+    def private_numbers(self):
+        raise TypeError('The private key stays in the signing daemon')
+
+    def private_bytes(self, encoding, format, encryption_algorithm):
+        raise TypeError('The private key stays in the signing daemon')
+
+    def __copy__(self):
+        return self
+
+    def __repr__(self):
+        return 'RemoteKey({!r}, {!r}, {!r})'.format(self.client.path, self.merchant_id, self.terminal_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m upcpayment.signing_daemon',
+                                     description='Signs for RemoteKey clients over a Unix socket.')
+    parser.add_argument('socket', help='path of the Unix socket')
+    parser.add_argument('--key', help='private key (*.pem) used for every merchant/terminal')
+    parser.add_argument('--merchant-key', nargs=3, action='append', default=[],
+                        metavar=('MERCHANT_ID', 'TERMINAL_ID', 'PATH'), help='private key of one merchant/terminal')
+    parser.add_argument('--workers', type=int, help='signing processes (default: number of cores)')
+    parser.add_argument('--chunksize', type=int, default=16)
+    args = parser.parse_args(argv)
+    if bool(args.key) == bool(args.merchant_key):
+        parser.error('give either --key or --merchant-key')
+
+    private_key = args.key
+    if args.merchant_key:
+        private_key = Keyring()
+        for merchant_id, terminal_id, path in args.merchant_key:
+            private_key.add(merchant_id, terminal_id, path)
+    daemon = SigningDaemon(args.socket, private_key, workers=args.workers, chunksize=args.chunksize)
+    try:
+        asyncio.run(daemon.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import random
+import string
+from multiprocessing import Process
+
+from .exceptions import InvalidInput, InvalidSignature
+from .lazy import lazy_import
+from .serializer import _ATTR_ESCAPES, _ATTR_SPECIAL, _TEXT_ESCAPES, _TEXT_SPECIAL, _escape
+from .signer import get_signer
+from .truststore import get_trust_store
+from .verifier import verify_enveloped
+
+asyncio = lazy_import('asyncio')
+etree = lazy_import('lxml.etree')
+
+# tags of the XMLPay response fields, in the order they are written
+_XMLPAY_TAGS = ('OrderID', 'TranCode', 'ApprovalCode', 'Rrn', 'Comment', 'HostCode', 'CVResult')
+_MPI_ENROL_TAGS = ('Code', 'Enrolled', 'ACSURL', 'PAReq', 'XID')
+_MPI_AUTH_TAGS = ('Code', 'Status', 'CAVV', 'ECI', 'CavvAlgorithm')
+_COMMENTS = {'000': 'Approved'}
+
+
+def _text(value):
+    return _escape(value, _TEXT_SPECIAL, _TEXT_ESCAPES)
+
+def _attr(value):
+    return _escape(value, _ATTR_SPECIAL, _ATTR_ESCAPES)
+
+def _elements(values, tags):
+    return ''.join('<{0}>{1}</{0}>'.format(tag, _text(values.get(tag, ''))) for tag in tags)
+
+def _random_string(alphabet, size):
+    return ''.join(random.choice(alphabet) for _ in range(size))
+
+
+class GatewaySimulator(object):
+    """
+    Local stand-in of the XMLPay gateway for load tests. Checks the signature
+    of every request against `certificate` (the merchant certificate, anything
+    TrustStore accepts; None accepts unsigned requests) and answers with a
+    response signed with `private_key`, shaped like the gateway's: one
+    TransactionResult per Transaction for batched messages.
+
+    Each answer is delayed by `latency` seconds plus up to `jitter` more;
+    `error_rate` of the requests get HTTP `error_status` instead.
+    `tran_codes` maps TranCode to its weight, e.g. {'000': 95, '105': 5}.
+    """
+    def __init__(self, private_key, certificate=None, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 tran_codes=None):
+        self.signer = get_signer(private_key)
+        self.trust_store = get_trust_store(certificate) if certificate is not None else None
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        tran_codes = tran_codes or {'000': 1}
+        self._codes = list(tran_codes)
+        self._weights = [tran_codes[code] for code in self._codes]
+        self.requests = 0
+        self.errors = 0
+        self._parser = etree.XMLParser(resolve_entities=False)
+
+    def _transaction_result(self, transaction):
+        tran_code = random.choices(self._codes, self._weights)[0]
+        approved = tran_code == '000'
+        return {
+            'OrderID': transaction.findtext('.//OrderID') or transaction.get('id', ''),
+            'TranCode': tran_code,
+            'ApprovalCode': _random_string(string.ascii_uppercase + string.digits, 6) if approved else '',
+            'Rrn': _random_string(string.digits, 12) if approved else '',
+            'Comment': _COMMENTS.get(tran_code, 'Declined'),
+            'HostCode': '00' if approved else '05',
+            'CVResult': 'M' if transaction.find('.//CVNum') is not None else '',
+        }
+
+    def respond(self, body):
+        """
+        Signed response document (bytes) for the signed request document `body`.
+        Raises InvalidSignature or InvalidInput for requests the gateway would reject.
+        """
+        try:
+            root = etree.fromstring(body, parser=self._parser)
+        except etree.XMLSyntaxError as exc:
+            raise InvalidInput('Request is not valid xml: {}'.format(exc))
+        if self.trust_store is not None:
+            root = verify_enveloped(root, self.trust_store)
+        message = root.find('Message')
+        if message is None:
+            raise InvalidInput('Waited for ECommerceConnect/Message')
+
+        mpi = message.find('XMLMPIRequest')
+        if mpi is not None:
+            header = {'MerchantID': mpi.findtext('MerchantID', ''), 'TerminalID': mpi.findtext('TerminalID', '')}
+            pares = mpi.find('MPIRequest/MPIAuthRequest/PARes')
+            if pares is not None:
+                values = {tag: pares.findtext(tag, '') for tag in _MPI_AUTH_TAGS}
+                values['Code'] = '0'
+                data = _elements(values, _MPI_AUTH_TAGS)
+            else:
+                values = {'Code': '0', 'Enrolled': 'Y', 'ACSURL': 'https://acs.example/',
+                          'PAReq': _random_string(string.ascii_letters, 24),
+                          'XID': _random_string(string.ascii_letters + string.digits, 28)}
+                data = _elements(values, _MPI_ENROL_TAGS)
+            response = '<XMLMPIResponse>{}<MPIResponse>{}</MPIResponse></XMLMPIResponse>'.format(
+                _elements(header, ('MerchantID', 'TerminalID')), data)
+        else:
+            request_data = message.find('XMLPayRequest/RequestData')
+            if request_data is None:
+                raise InvalidInput('Waited for XMLMPIRequest or XMLPayRequest')
+            header = _elements({'MerchantID': request_data.findtext('MerchantID', ''),
+                                'TerminalID': request_data.findtext('TerminalID', '')}, ('MerchantID', 'TerminalID'))
+            transactions = request_data.findall('Transactions/Transaction')
+            if not transactions:
+                raise InvalidInput('Request has no Transaction')
+            if len(transactions) == 1:
+                data = header + _elements(self._transaction_result(transactions[0]), _XMLPAY_TAGS)
+            else:
+                data = header + ''.join('<TransactionResult id="{}">{}</TransactionResult>'.format(
+                    _attr(transaction.get('id', '')),
+                    _elements(self._transaction_result(transaction), _XMLPAY_TAGS)) for transaction in transactions)
+            response = '<XMLPayResponse><ResponseData>{}</ResponseData></XMLPayResponse>'.format(data)
+
+        canonical = '<ECommerceConnect><Message id="{}" version="1.0">{}</Message></ECommerceConnect>'.format(
+            _attr(message.get('id', '')), response)
+        return self.signer.sign_canonical(canonical.encode('utf-8'))
+
+    async def handle(self, body):
+        """
+        (HTTP status, body) of the answer to a POSTed request, after the simulated latency.
+        """
+        self.requests += 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            return self.error_status, b'Simulated gateway error'
+        try:
+            return 200, self.respond(body)
+        except (InvalidInput, InvalidSignature) as exc:
+            self.errors += 1
+            return 400, str(exc).encode('utf-8')
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.partition(b':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get(b'content-length', 0)))
+                keep_alive = (request_line.rstrip().endswith(b'HTTP/1.1')
+                              and headers.get(b'connection', b'').lower() != b'close')
+
+                status, answer = await self.handle(body)
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: text/xml; charset=utf-8\r\nContent-Length: %d\r\n'
+                             b'Connection: %s\r\n\r\n' % (status, b'OK' if status == 200 else b'Error', len(answer),
+                                                          b'keep-alive' if keep_alive else b'close') + answer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8080, reuse_port=False):
+        """
+        Serves HTTP POST requests (any path) until cancelled.
+        """
+        server = await asyncio.start_server(self._serve_connection, host, port, reuse_port=reuse_port or None)
+        async with server:
+            await server.serve_forever()
+
+
+def _serve_process(options, host, port, reuse_port):
+    simulator = GatewaySimulator(**options)
+    try:
+        asyncio.run(simulator.serve(host, port, reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+def _tran_codes(value):
+    tran_codes = {}
+    for item in value.split(','):
+        code, _, weight = item.partition(':')
+        tran_codes[code.strip()] = float(weight or 1)
+    return tran_codes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m upcpayment.simulator',
+                                     description='Local XMLPay gateway for load tests.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--key', required=True, help='private key (*.pem) the responses are signed with')
+    parser.add_argument('--client-cert', help='merchant certificate the requests are checked with')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before every answer')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many seconds more')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with an error')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--tran-codes', type=_tran_codes, default={'000': 1},
+                        help='TranCode mix, e.g. 000:95,105:5')
+    parser.add_argument('--processes', type=int, default=1, help='server processes sharing the port')
+    args = parser.parse_args(argv)
+
+    options = {'private_key': args.key, 'certificate': args.client_cert, 'latency': args.latency,
+               'jitter': args.jitter, 'error_rate': args.error_rate, 'error_status': args.error_status,
+               'tran_codes': args.tran_codes}
+    if args.processes == 1:
+        _serve_process(options, args.host, args.port, False)
+        return
+    processes = [Process(target=_serve_process, args=(options, args.host, args.port, True))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == '__main__':
+    main()
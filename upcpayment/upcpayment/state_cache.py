@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import OrderedDict
+
+from .lazy import lazy_import
+
+asyncio = lazy_import('asyncio')
+
+
+def _state_key(request):
+    return request.merchant_id, request.terminal_id, request.order_id
+
+def is_pending(response, pending_codes=()):
+    """
+    True if the transaction state is not final yet: tran_code is empty or one of `pending_codes`.
+    """
+    return not response.tran_code or response.tran_code in pending_codes
+
+
+def _retrieve_exception(task):
+    # nobody may be waiting for the task any more (all callers cancelled)
+    if not task.cancelled():
+        task.exception()
+
+
+class _StateCache(object):
+    def __init__(self, send, maxsize=10000, final_ttl=300.0, pending_ttl=2.0, pending_codes=()):
+        self.send = send
+        self.maxsize = maxsize
+        self.final_ttl = final_ttl
+        self.pending_ttl = pending_ttl
+        self.pending_codes = frozenset(pending_codes)
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._responses = OrderedDict()
+        self._flights = {}
+
+    def _cached(self, key):
+        cached = self._responses.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self._responses.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            del self._responses[key]
+        return None
+
+    def _store(self, key, response):
+        ttl = self.pending_ttl if is_pending(response, self.pending_codes) else self.final_ttl
+        if ttl <= 0:
+            return
+        self._responses[key] = (time.monotonic() + ttl, response)
+        self._responses.move_to_end(key)
+        while len(self._responses) > self.maxsize:
+            self._responses.popitem(last=False)
+
+    def invalidate(self, merchant_id, terminal_id, order_id):
+        self._responses.pop((merchant_id, terminal_id, order_id), None)
+
+    def clear(self):
+        self._responses.clear()
+
+    def __len__(self):
+        return len(self._responses)
+
+
+class _Flight(object):
+    __slots__ = ('done', 'response', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class TransactionStateCache(_StateCache):
+    """
+    Single-flight cache in front of `send` (e.g. GatewaySession.send) for
+    TransactionStateRequest: threads asking for the same merchant/terminal/order
+    at the same time share one gateway request, and the response is kept for
+    `final_ttl` seconds, or `pending_ttl` seconds if its tran_code is empty or
+    in `pending_codes`. Keeps at most `maxsize` responses (least recently used are dropped).
+    Errors are not cached; callers waiting for the failed request get the same exception.
+    """
+    def __init__(self, send, maxsize=10000, final_ttl=300.0, pending_ttl=2.0, pending_codes=()):
+        super().__init__(send, maxsize, final_ttl, pending_ttl, pending_codes)
+        self._lock = threading.Lock()
+
+    def get(self, request):
+        key = _state_key(request)
+        with self._lock:
+            response = self._cached(key)
+            if response is not None:
+                return response
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = self.send(request)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._store(key, flight.response)
+                del self._flights[key]
+            flight.done.set()
+        return flight.response
+
+    def invalidate(self, merchant_id, terminal_id, order_id):
+        with self._lock:
+            super().invalidate(merchant_id, terminal_id, order_id)
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+
+
+class AsyncTransactionStateCache(_StateCache):
+    """
+    TransactionStateCache for coroutines, in front of e.g. AsyncGatewayClient.send.
+    The shared request runs as its own task, so a cancelled caller does not
+    cancel it for the others; its response is cached even if all callers
+    were cancelled.
+    """
+    async def get(self, request):
+        key = _state_key(request)
+        response = self._cached(key)
+        if response is not None:
+            return response
+        task = self._flights.get(key)
+        if task is None:
+            task = self._flights[key] = asyncio.ensure_future(self._fetch(key, request))
+            task.add_done_callback(_retrieve_exception)
+            self.misses += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, request):
+        try:
+            response = await self.send(request)
+            self._store(key, response)
+            return response
+        finally:
+            del self._flights[key]
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+# installed hooks; the hot paths only check that this list is not empty
+_hooks = []
+
+
+def add_hook(hook):
+    """
+    Installs hook(message_type, stage, seconds), called after every stage
+    of signing and response parsing:
+
+    key_read   - loading the private key or the gateway certificate
+                 (a file read only on the first use)
+    tree_build - parsing the response
+    c14n       - canonicalization / serialization of the document
+    digest     - digest of the canonical document
+    rsa        - RSA signing or signature verification
+    tostring   - writing out the signed document
+    validate   - schema validation (only if enabled)
+    fields     - reading the response fields
+
+    The hook runs in the thread doing the work and should return quickly.
+    """
+    _hooks.append(hook)
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+@contextmanager
+def stage_timings(hook):
+    """
+    Installs the hook for the duration of the with-block.
+    """
+    add_hook(hook)
+    try:
+        yield hook
+    finally:
+        remove_hook(hook)
+
+
+class StageTimer(object):
+    """
+    Reports the time since the previous lap (or since it was created) to the hooks.
+    Hot paths create it only when a hook is installed:
+
+        timer = StageTimer('AuthorizationRequest') if _hooks else None
+        ...
+        if timer: timer.lap('c14n')
+    """
+    __slots__ = ('message_type', '_start')
+
+    def __init__(self, message_type):
+        self.message_type = message_type
+        self._start = perf_counter()
+
+    def lap(self, stage):
+        seconds = perf_counter() - self._start
+        for hook in tuple(_hooks):
+            hook(self.message_type, stage, seconds)
+        # time spent in the hooks is not counted in the next stage
+        self._start = perf_counter()
@@ -0,0 +1,117 @@
+import base64
+import binascii
+import os
+import threading
+from collections import OrderedDict
+
+from .exceptions import InvalidSignature
+from .lazy import lazy_import
+from .verifier import load_certificate
+
+cryptography_exceptions = lazy_import('cryptography.exceptions')
+hashes = lazy_import('cryptography.hazmat.primitives.hashes')
+padding = lazy_import('cryptography.hazmat.primitives.asymmetric.padding')
+rsa = lazy_import('cryptography.hazmat.primitives.asymmetric.rsa')
+serialization = lazy_import('cryptography.hazmat.primitives.serialization')
+
+
+class TrustStore(object):
+    """
+    Gateway certificates, parsed once. Holds several certificates at a time,
+    so responses signed with the old and the new key are both accepted
+    during a gateway key rollover.
+    """
+    def __init__(self, *certificates):
+        self._lock = threading.Lock()
+        self.certificates = ()
+        self.public_keys = ()
+        self.certificate_pems = ()
+        for certificate in certificates:
+            self.add(certificate)
+
+    def add(self, certificate):
+        certificate = load_certificate(certificate)
+        with self._lock:
+            if certificate in self.certificates:
+                return
+            self._update(self.certificates + (certificate,))
+
+    def remove(self, certificate):
+        certificate = load_certificate(certificate)
+        with self._lock:
+            self._update(tuple(cert for cert in self.certificates if cert != certificate))
+
+    def _update(self, certificates):
+        # readers take the tuples without the lock, so they are replaced, not changed
+        self.public_keys = tuple(cert.public_key() for cert in certificates)
+        self.certificate_pems = tuple(cert.public_bytes(serialization.Encoding.PEM).decode('ascii') for cert in certificates)
+        self.certificates = certificates
+
+    def verify(self, data, signature):
+        """
+        Checks a base64 RSA-SHA1 signature of the data string (PaymentPage).
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        try:
+            raw_signature = base64.b64decode(signature)
+        except (ValueError, binascii.Error):
+            raise InvalidSignature('Signature is not valid')
+        for public_key in self.public_keys:
+            if not isinstance(public_key, rsa.RSAPublicKey):
+                continue
+            try:
+                public_key.verify(raw_signature, data, padding.PKCS1v15(), hashes.SHA1())
+                return True
+            except cryptography_exceptions.InvalidSignature:
+                continue
+        raise InvalidSignature('Signature is not valid')
+
+    def __len__(self):
+        return len(self.certificates)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+# stores for PEM bytes and certificate objects: bytes and cryptography certificates
+# are compared by value, OpenSSL.crypto.X509 objects by identity
+_certificate_stores = OrderedDict()
+_CERTIFICATE_STORES_MAXSIZE = 1024
+
+def _get_certificate_store(certificate):
+    with _stores_lock:
+        store = _certificate_stores.get(certificate)
+        if store is not None:
+            _certificate_stores.move_to_end(certificate)
+            return store
+
+    store = TrustStore(certificate)
+    with _stores_lock:
+        store = _certificate_stores.setdefault(certificate, store)
+        _certificate_stores.move_to_end(certificate)
+        while len(_certificate_stores) > _CERTIFICATE_STORES_MAXSIZE:
+            _certificate_stores.popitem(last=False)
+    return store
+
+def get_trust_store(certificate):
+    """
+    Returns `certificate` if it is a TrustStore, otherwise a TrustStore with
+    this one certificate. Stores are cached: for certificate files they are
+    reloaded when the file changes, for PEM bytes and certificate objects
+    the same certificate gets the same store.
+    """
+    if isinstance(certificate, TrustStore):
+        return certificate
+    if not isinstance(certificate, (str, os.PathLike)):
+        return _get_certificate_store(certificate)
+
+    path = os.fspath(certificate)
+    st = os.stat(path)
+    stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _stores.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    store = TrustStore(path)
+    with _stores_lock:
+        _stores[path] = (stamp, store)
+    return store
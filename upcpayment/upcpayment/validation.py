@@ -0,0 +1,51 @@
+import os
+import threading
+from functools import lru_cache
+
+from .exceptions import InvalidInput
+from .lazy import lazy_import
+from .serializer import serialize, serialize_batch
+
+etree = lazy_import('lxml.etree')
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema', 'xmlpay.xsd')
+
+# default of generate_xml_with_signature(validate=None); off, so production signing skips it
+validate_requests = False
+
+_schema_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_schema():
+    """
+    The bundled xmlpay schema, compiled on first use. Nothing is fetched from the network.
+    """
+    parser = etree.XMLParser(no_network=True, resolve_entities=False)
+    return etree.XMLSchema(etree.parse(SCHEMA_PATH, parser))
+
+
+def _check(document, name):
+    schema = get_schema()
+    document = etree.fromstring(document)
+    # the error log belongs to the schema object, so one validation at a time
+    with _schema_lock:
+        if schema.validate(document):
+            return
+        errors = '; '.join(error.message for error in schema.error_log)
+    raise InvalidInput('{} does not match the xmlpay schema: {}'.format(name, errors))
+
+
+def validate(request):
+    """
+    Checks the unsigned document of a Upc_payment_xml request against the
+    bundled schema, raises InvalidInput with the schema errors if it does not match.
+    """
+    _check(serialize(request), type(request).__name__)
+
+
+def validate_batch(requests, message_id=None):
+    """
+    validate for the document of a MessageBatch.
+    """
+    _check(serialize_batch(requests, message_id), 'MessageBatch')
@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import os
+from functools import lru_cache
+
+from .exceptions import InvalidSignature
+from .lazy import lazy_import
+
+x509 = lazy_import('cryptography.x509')
+cryptography_exceptions = lazy_import('cryptography.exceptions')
+hashes = lazy_import('cryptography.hazmat.primitives.hashes')
+padding = lazy_import('cryptography.hazmat.primitives.asymmetric.padding')
+rsa = lazy_import('cryptography.hazmat.primitives.asymmetric.rsa')
+etree = lazy_import('lxml.etree')
+crypto = lazy_import('OpenSSL.crypto')
+signxml = lazy_import('signxml')
+
+_DS = '{http://www.w3.org/2000/09/xmldsig#}'
+_EXC_C14N = 'http://www.w3.org/2001/10/xml-exc-c14n#'
+_ENVELOPED = 'http://www.w3.org/2000/09/xmldsig#enveloped-signature'
+_SIGNATURE_METHODS = {'http://www.w3.org/2000/09/xmldsig#rsa-sha1': 'SHA1',
+                      'http://www.w3.org/2001/04/xmldsig-more#rsa-sha256': 'SHA256'}
+_DIGEST_METHODS = {'http://www.w3.org/2000/09/xmldsig#sha1': hashlib.sha1,
+                   'http://www.w3.org/2001/04/xmlenc#sha256': hashlib.sha256}
+
+@lru_cache(maxsize=None)
+def _signatures():
+    return etree.XPath('//ds:Signature', namespaces={'ds': _DS[1:-1]})
+
+
+def load_certificate(certificate):
+    """
+    Accepts a path to the *.pem/*.crt file, PEM bytes, a cryptography or
+    OpenSSL.crypto certificate and returns the cryptography certificate.
+    """
+    if isinstance(certificate, bytes):
+        return x509.load_pem_x509_certificate(certificate)
+    if isinstance(certificate, (str, os.PathLike)):
+        with open(certificate, 'rb') as cert_file:
+            return x509.load_pem_x509_certificate(cert_file.read())
+    if isinstance(certificate, x509.Certificate):
+        return certificate
+    if isinstance(certificate, crypto.X509):
+        return certificate.to_cryptography()
+    with open(certificate, 'rb') as cert_file:
+        return x509.load_pem_x509_certificate(cert_file.read())
+
+
+def _remove_signature(signature):
+    parent = signature.getparent()
+    if signature.tail:
+        previous = signature.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or '') + signature.tail
+        else:
+            parent.text = (parent.text or '') + signature.tail
+    parent.remove(signature)
+
+
+def _fixed_shape(signed_info):
+    """
+    Returns (hash, digest function, digest value) if SignedInfo has the shape
+    our documents use: exc-c14n, rsa-sha1/rsa-sha256 and one enveloped
+    reference to the whole document. Otherwise returns None.
+    """
+    children = list(signed_info)
+    if len(children) != 3 or [child.tag for child in children] != [
+            _DS + 'CanonicalizationMethod', _DS + 'SignatureMethod', _DS + 'Reference']:
+        return None
+    c14n_method, signature_method, reference = children
+    if c14n_method.get('Algorithm') != _EXC_C14N or len(c14n_method):
+        return None
+    if signature_method.get('Algorithm') not in _SIGNATURE_METHODS or reference.get('URI') != '':
+        return None
+
+    parts = list(reference)
+    if [part.tag for part in parts] != [_DS + 'Transforms', _DS + 'DigestMethod', _DS + 'DigestValue']:
+        return None
+    transforms, digest_method, digest_value = parts
+    if [(t.tag, t.get('Algorithm'), len(t)) for t in transforms] != [
+            (_DS + 'Transform', _ENVELOPED, 0), (_DS + 'Transform', _EXC_C14N, 0)]:
+        return None
+    if digest_method.get('Algorithm') not in _DIGEST_METHODS:
+        return None
+    return (getattr(hashes, _SIGNATURE_METHODS[signature_method.get('Algorithm')]),
+            _DIGEST_METHODS[digest_method.get('Algorithm')],
+            (digest_value.text or '').strip())
+
+
+def _verify_with_signxml(root, trust_store):
+    for certificate_pem in trust_store.certificate_pems:
+        try:
+            return signxml.XMLVerifier().verify(root, x509_cert=certificate_pem).signed_xml
+        except signxml.exceptions.InvalidSignature:
+            continue
+    raise InvalidSignature('Response signature is not valid')
+
+
+def verify_enveloped(root, trust_store, timer=None):
+    """
+    Checks the enveloped signature of a strictly parsed response against the
+    certificates of the TrustStore and returns the element whose content is signed.
+
+    Documents signed like our requests are checked in place with one c14n
+    of SignedInfo and one of the document; anything else goes through
+    signxml.XMLVerifier. `timer` is a timing.StageTimer to report the stages to.
+    """
+    signatures = _signatures()(root)
+    if len(signatures) != 1 or signatures[0].getparent() is not root:
+        raise InvalidSignature('Waited for one enveloped signature')
+    signature = signatures[0]
+    signed_info = signature.find(_DS + 'SignedInfo')
+    signature_value = signature.find(_DS + 'SignatureValue')
+    shape = _fixed_shape(signed_info) if signed_info is not None and signature_value is not None else None
+    if shape is None:
+        signed_xml = _verify_with_signxml(root, trust_store)
+        if timer: timer.lap('rsa')
+        return signed_xml
+    hash_alg, digest_alg, digest_value = shape
+
+    try:
+        raw_signature = base64.b64decode(signature_value.text or '')
+    except ValueError:
+        raise InvalidSignature('Response signature is not valid')
+    signed_info_c14n = etree.tostring(signed_info, method='c14n', exclusive=True, with_comments=False)
+    if timer: timer.lap('c14n')
+    for public_key in trust_store.public_keys:
+        if not isinstance(public_key, rsa.RSAPublicKey):
+            continue
+        try:
+            public_key.verify(raw_signature, signed_info_c14n, padding.PKCS1v15(), hash_alg())
+            break
+        except cryptography_exceptions.InvalidSignature:
+            continue
+    else:
+        raise InvalidSignature('Response signature is not valid')
+    if timer: timer.lap('rsa')
+
+    _remove_signature(signature)
+    # exc-c14n without comments, as a same-document reference (URI="") requires
+    canonical = etree.tostring(root, method='c14n', exclusive=True, with_comments=False)
+    if timer: timer.lap('c14n')
+    digest = base64.b64encode(digest_alg(canonical).digest())
+    if timer: timer.lap('digest')
+    if digest.decode('ascii') != digest_value:
+        raise InvalidSignature('Response digest is not valid')
+    return root